@@ -1,16 +1,39 @@
 # analyze_data.py
 import sqlite3
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-DATABASE_NAME = "dossier_activities_v3.db"
+from process_variants import VariantTrie, END
 
-def run_analysis():
+# The stage duration and workload reports need the derived tables of process_dossiers_v4.py.
+DATABASE_NAME = "dossiers_v4.db"
+
+# Lifecycle stage pairs reported from the StageDurations table (first occurrence of each action).
+STAGE_PAIRS = [
+    ("Dépôt", "Avis du Conseil d'Etat"),
+    ("Avis du Conseil d'Etat", "Rapport de commission"),
+    ("Rapport de commission", "Premier vote"),
+    ("Premier vote", "Publication"),
+    ("Dispense du second vote", "Publication"),
+]
+
+# Number of entities whose open-dossier timeline is plotted by the workload analysis.
+WORKLOAD_PLOT_TOP = 5
+
+# Path prefix whose divergence is reported by the process variant analysis. Paths start at the trie root,
+# and nearly every dossier starts with 'Dépôt'.
+VARIANT_PREFIX = ["Dépôt", "Avis"]
+# Action whose divergence is also reported wherever it occurs in a path.
+VARIANT_ACTION = "Avis"
+
+def run_analysis(db_name=DATABASE_NAME):
     """Connects to the DB and runs all statistical analysis functions."""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        print(f"Successfully connected to {DATABASE_NAME}")
+        # mode=rw: a mistyped path fails here instead of silently creating an empty database.
+        conn = sqlite3.connect(f"file:{db_name}?mode=rw", uri=True)
+        print(f"Successfully connected to {db_name}")
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return
@@ -18,6 +41,8 @@ def run_analysis():
     # Load data into pandas DataFrames
     dossiers_df = pd.read_sql_query("SELECT * FROM Dossiers", conn)
     activities_df = pd.read_sql_query("SELECT * FROM Activities", conn)
+    stage_df = load_stage_durations(conn)
+    workload_df = load_workload_intervals(conn)
     conn.close()
 
     print("\n--- 📊 Overall Statistics ---")
@@ -28,12 +53,21 @@ def run_analysis():
 
     print("\n--- ⏳ Dossier Lifecycle Analysis ---")
     lifecycle_analysis(dossiers_df)
+
+    print("\n--- ⏱️ Stage Duration Analysis ---")
+    stage_duration_analysis(stage_df)
     
     print("\n--- 🧑‍⚖️ Rapporteur Analysis ---")
     rapporteur_analysis(activities_df)
 
+    print("\n--- 📈 Workload Timeline Analysis ---")
+    workload_analysis(workload_df)
+
     print("\n--- 🏛️ Activity Flow Analysis ---")
     activity_flow_analysis(activities_df)
+
+    print("\n--- 🌳 Process Variant Analysis ---")
+    process_variant_analysis(activities_df)
     
     print("\n--- ✅ Analysis Complete ---")
     print("Plots have been saved as PNG files in the current directory.")
@@ -66,6 +100,39 @@ def lifecycle_analysis(df):
     plt.savefig('dossier_duration_distribution.png')
     plt.close()
 
+def load_stage_durations(conn):
+    """Reads the precomputed StageDurations table, if the database has one."""
+    try:
+        return pd.read_sql_query("""
+            SELECT dossier_id, from_action, to_action, duration_days
+            FROM StageDurations
+        """, conn)
+    except pd.errors.DatabaseError:
+        # Databases built before StageDurations existed (e.g. v3) simply skip this report.
+        return pd.DataFrame(columns=['dossier_id', 'from_action', 'to_action', 'duration_days'])
+
+def stage_duration_analysis(df):
+    """Reports the time spent between lifecycle stages, read straight from StageDurations."""
+    if df.empty:
+        print("No stage duration data found. Build the database with process_dossiers_v4.py.")
+        return
+
+    for from_action, to_action in STAGE_PAIRS:
+        pair = df[(df['from_action'] == from_action) & (df['to_action'] == to_action)]
+        if pair.empty:
+            print(f"{from_action} -> {to_action}: no dossiers")
+            continue
+        print(f"{from_action} -> {to_action}: median {pair['duration_days'].median():.0f} days "
+              f"(mean {pair['duration_days'].mean():.0f}, n={len(pair)})")
+
+    summary = (df.groupby(['from_action', 'to_action'])['duration_days']
+                 .agg(dossiers='count', median_days='median')
+                 .reset_index())
+    top_pairs = summary.sort_values('dossiers', ascending=False).head(15)
+
+    print("\nTop 15 Stage Pairs by Number of Dossiers:")
+    print(top_pairs.to_string(index=False))
+
 def rapporteur_analysis(df):
     """Analyzes the activity of rapporteurs."""
     # Filter for activities where a rapporteur is named
@@ -90,6 +157,69 @@ def rapporteur_analysis(df):
     plt.savefig('top_rapporteurs.png')
     plt.close()
 
+def load_workload_intervals(conn):
+    """Reads the WorkloadIntervals step functions, if the database has them."""
+    try:
+        return pd.read_sql_query("""
+            SELECT entity_type, entity, valid_from, valid_to, open_dossiers
+            FROM WorkloadIntervals
+        """, conn)
+    except pd.errors.DatabaseError:
+        # Databases built before the workload timelines existed (e.g. v3) simply skip this report.
+        return pd.DataFrame(columns=['entity_type', 'entity', 'valid_from', 'valid_to', 'open_dossiers'])
+
+def workload_analysis(df):
+    """Reports peak and current open-dossier counts per commission and rapporteur, and plots the busiest commissions."""
+    if df.empty:
+        print("No workload data found. Build the database with process_dossiers_v4.py.")
+        return
+
+    for entity_type in ['commission', 'rapporteur']:
+        entity_df = df[df['entity_type'] == entity_type]
+        if entity_df.empty:
+            continue
+        peaks = (entity_df.sort_values('valid_from')
+                 .loc[lambda d: d.groupby('entity')['open_dossiers'].idxmax()]
+                 .sort_values('open_dossiers', ascending=False)
+                 .head(10))
+        print(f"Top 10 {entity_type.capitalize()}s by Peak Open Dossiers:")
+        print(peaks[['entity', 'open_dossiers', 'valid_from']]
+              .rename(columns={'open_dossiers': 'peak', 'valid_from': 'reached_on'})
+              .to_string(index=False))
+
+        # Intervals without an end are still running.
+        current = entity_df[entity_df['valid_to'].isna()].nlargest(10, 'open_dossiers')
+        print(f"\n{entity_type.capitalize()}s with the most dossiers still open:")
+        print(current[['entity', 'open_dossiers']].to_string(index=False))
+        print()
+
+    commissions = df[df['entity_type'] == 'commission']
+    if commissions.empty:
+        return
+    top_commissions = commissions.groupby('entity')['open_dossiers'].max().nlargest(WORKLOAD_PLOT_TOP).index
+
+    # Plotting the step functions; gaps between intervals are periods with no open dossier.
+    plt.figure(figsize=(14, 8))
+    today = pd.Timestamp.today().normalize()
+    for commission in top_commissions:
+        days, counts = [], []
+        for row in commissions[commissions['entity'] == commission].sort_values('valid_from').itertuples():
+            start = pd.Timestamp(row.valid_from)
+            end = pd.Timestamp(row.valid_to) if pd.notna(row.valid_to) else today
+            if days and days[-1] < start:
+                days.append(days[-1])
+                counts.append(0)
+            days.extend([start, end])
+            counts.extend([row.open_dossiers, row.open_dossiers])
+        plt.step(days, counts, where='post', label=commission)
+    plt.title(f'Concurrently Open Dossiers of the {WORKLOAD_PLOT_TOP} Busiest Commissions')
+    plt.xlabel('Date')
+    plt.ylabel('Open Dossiers')
+    plt.legend(fontsize='small')
+    plt.tight_layout()
+    plt.savefig('commission_workload.png')
+    plt.close()
+
 def activity_flow_analysis(df):
     """Analyzes the common sequences of activities."""
     # This is a simplified version; a true Sankey diagram is more complex
@@ -110,5 +240,34 @@ def activity_flow_analysis(df):
     print("Top 15 Most Common Activity Transitions:")
     print(top_transitions.to_string(index=False))
 
+def process_variant_analysis(df):
+    """Reports the most common complete legislative paths and where dossiers diverge."""
+    # Sorted once to build the trie; every query afterwards is answered from the trie.
+    df_sorted = df.dropna(subset=['action']).sort_values(by=['dossier_id', 'activity_date', 'activity_id'])
+    trie = VariantTrie.from_rows(df_sorted[['dossier_id', 'action']].itertuples(index=False, name=None))
+
+    if trie.dossier_count == 0:
+        print("No activity actions found to build process variants.")
+        return
+
+    print(f"Top 10 Process Variants ({trie.dossier_count} dossiers):")
+    for variant, count in trie.top_variants(10):
+        print(f"{count:>6} ({count / trie.dossier_count:.1%})  {' → '.join(variant)}")
+
+    node = trie.find(VARIANT_PREFIX)
+    print(f"\nNext step after {' → '.join(VARIANT_PREFIX)} ({node.count if node else 0} dossiers):")
+    for action, count, fraction in trie.next_steps(VARIANT_PREFIX):
+        label = "path ends" if action == END else action
+        print(f"  {label}: {count} ({fraction:.1%})")
+
+    print(f"\nNext step after any {VARIANT_ACTION} in the path:")
+    for action, count, fraction in trie.next_steps_anywhere(VARIANT_ACTION):
+        label = "path ends" if action == END else action
+        print(f"  {label}: {count} ({fraction:.1%})")
+
 if __name__ == "__main__":
-    run_analysis()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the statistical analysis of the dossier database.")
+    parser.add_argument("--db_name", type=str, default=DATABASE_NAME, help="SQLite database to analyze.")
+
+    args = parser.parse_args()
+    run_analysis(args.db_name)
\ No newline at end of file
@@ -0,0 +1,142 @@
+# build_sharded.py
+import os
+import shutil
+import logging
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+from process_dossiers_v4 import (
+    setup_database,
+    find_json_files,
+    ingest_files,
+    finalize_database,
+)
+from snapshot import run_snapshot_build, MAX_ROW_DROP
+
+# Columns copied from each shard. activity_id is left out on purpose so the main database
+# assigns ids in merge order, which matches the order of a serial build.
+ACTIVITY_COLUMNS = (
+    "dossier_id, activity_date, activity_link, activity_hash, action, actor, "
+    "rapporteur, commission, vote_outcome, publication_source, publication_number, publication_page"
+)
+DOSSIER_COLUMNS = (
+    "dossier_id, title, first_activity_date, last_activity_date, final_status, "
+    "total_duration_days, file_name"
+)
+
+
+def split_into_shards(json_files, shard_count):
+    """Splits the (dossier-id ordered) file list into contiguous id ranges of similar size."""
+    shard_count = max(1, min(shard_count, len(json_files)))
+    shard_size, remainder = divmod(len(json_files), shard_count)
+    shards, start = [], 0
+    for i in range(shard_count):
+        end = start + shard_size + (1 if i < remainder else 0)
+        shards.append(json_files[start:end])
+        start = end
+    return shards
+
+
+def build_shard(task):
+    """Worker entry point: ingests one range of dossiers into its own shard database."""
+    shard_path, json_files = task
+    conn = setup_database(shard_path)
+    # Shards are throwaway intermediates; durability is provided by the final merge. The journal stays
+    # in memory rather than OFF: without a journal SQLite ignores ROLLBACK TO, and a failed file would
+    # leave a half-ingested dossier in the shard.
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    ingest_files(conn, json_files)
+
+    conn.close()
+    logging.info(f"Shard {os.path.basename(shard_path)} done ({len(json_files)} files).")
+    return shard_path
+
+
+def merge_shards(db_name, shard_paths):
+    """Combines the shard databases into db_name with ATTACH + INSERT ... SELECT."""
+    conn = setup_database(db_name)
+    cursor = conn.cursor()
+
+    for shard_path in shard_paths:
+        logging.info(f"Merging shard {os.path.basename(shard_path)}")
+        cursor.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        cursor.execute(f"INSERT OR IGNORE INTO Dossiers ({DOSSIER_COLUMNS}) SELECT {DOSSIER_COLUMNS} FROM shard.Dossiers")
+        # Interned texts get new ids in the main database; activities are re-pointed via the text hash.
+        cursor.execute("""
+            INSERT OR IGNORE INTO ActivityTexts (text_hash, codec, dict_id, body)
+            SELECT text_hash, codec, dict_id, body FROM shard.ActivityTexts ORDER BY text_id
+        """)
+        shard_columns = ", ".join(f"a.{column.strip()}" for column in ACTIVITY_COLUMNS.split(","))
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO Activities ({ACTIVITY_COLUMNS}, text_id)
+            SELECT {shard_columns}, t.text_id
+            FROM shard.Activities a
+            LEFT JOIN shard.ActivityTexts st ON st.text_id = a.text_id
+            LEFT JOIN main.ActivityTexts t ON t.text_hash = st.text_hash
+            ORDER BY a.activity_id
+        """)
+        cursor.execute("INSERT OR IGNORE INTO IngestProgress (file_name, dossier_id, committed_at) SELECT file_name, dossier_id, committed_at FROM shard.IngestProgress")
+        conn.commit()
+        cursor.execute("DETACH DATABASE shard")
+
+    # Indexes and dossier summaries are rebuilt once on the merged data.
+    finalize_database(conn)
+    conn.close()
+
+
+def build_database(json_files, db_name, workers, keep_shards=False):
+    """Builds db_name from json_files using one writer process per shard."""
+    shards = split_into_shards(json_files, workers)
+    shard_dir = tempfile.mkdtemp(prefix="shards_", dir=os.path.dirname(os.path.abspath(db_name)))
+    tasks = [(os.path.join(shard_dir, f"shard_{i:03d}.db"), files) for i, files in enumerate(shards)]
+    logging.info(f"Found {len(json_files)} JSON files. Building {len(tasks)} shards in {shard_dir}")
+
+    try:
+        with Pool(processes=len(tasks)) as pool:
+            shard_paths = pool.map(build_shard, tasks)
+        merge_shards(db_name, shard_paths)
+    finally:
+        if not keep_shards:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+def main(json_path, db_name, workers, keep_shards=False, snapshot=False, keep_snapshots=3, max_row_drop=MAX_ROW_DROP):
+    """Finds the JSON files and builds db_name from them in parallel shards."""
+    json_files = find_json_files(json_path)
+    if not json_files:
+        logging.warning("No JSON files found in the specified directory. Exiting.")
+        return
+
+    if snapshot:
+        run_snapshot_build(
+            db_name,
+            lambda build_path: build_database(json_files, build_path, workers, keep_shards),
+            keep_snapshots,
+            max_row_drop,
+        )
+    else:
+        build_database(json_files, db_name, workers, keep_shards)
+
+    logging.info("--- Sharded database build complete! ---")
+    logging.info(f"Data is stored in '{db_name}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the dossier database in parallel shards and merge them.")
+    parser.add_argument("json_path", type=str, help="Path to the root folder containing the JSON files.")
+    parser.add_argument("--db_name", type=str, default="dossiers_v4.db", help="Name for the output SQLite database file.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of shard databases / writer processes.")
+    parser.add_argument("--keep_shards", action="store_true", help="Keep the shard databases after merging.")
+    parser.add_argument("--snapshot", action="store_true", help="Build into a temporary file and atomically swap it in when valid.")
+    parser.add_argument("--keep_snapshots", type=int, default=3, help="Number of previous databases kept for rollback in snapshot mode.")
+    parser.add_argument("--max_row_drop", type=float, default=MAX_ROW_DROP, help="Largest allowed shrink of dossiers/activities versus the live database in snapshot mode (0.1 = 10%%).")
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.json_path):
+        logging.error(f"Error: The specified path '{args.json_path}' does not exist or is not a directory.")
+    else:
+        main(args.json_path, args.db_name, args.workers, args.keep_shards, args.snapshot, args.keep_snapshots, args.max_row_drop)
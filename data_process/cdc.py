@@ -0,0 +1,181 @@
+# cdc.py
+import os
+import json
+import sqlite3
+import logging
+import argparse
+
+def create_cdc_tables(conn):
+    """
+    Creates the change-data-capture tables. They are never dropped by a rebuild: the state tables
+    remember what the previous run produced, and ChangeLog is the durable feed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS CdcRuns (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        captured_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        change_count INTEGER
+    )""")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id INTEGER NOT NULL,
+        change_type TEXT NOT NULL,
+        dossier_id TEXT NOT NULL,
+        activity_hash TEXT,
+        old_value TEXT,
+        new_value TEXT,
+        payload TEXT,
+        FOREIGN KEY (run_id) REFERENCES CdcRuns (run_id)
+    )""")
+    # What the previous run looked like: dossier statuses and every activity hash ever seen.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS CdcDossierState (
+        dossier_id TEXT PRIMARY KEY,
+        final_status TEXT
+    ) WITHOUT ROWID""")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS CdcSeenActivities (
+        activity_hash TEXT PRIMARY KEY
+    ) WITHOUT ROWID""")
+    conn.commit()
+
+
+def capture_changes(conn):
+    """
+    Compares the freshly built Dossiers/Activities with the state of the previous run, appends the
+    differences to ChangeLog as one run, and then advances the state. Returns the number of changes.
+    """
+    logging.info("Capturing changes since the previous run.")
+    create_cdc_tables(conn)
+    cursor = conn.cursor()
+
+    cursor.execute("INSERT INTO CdcRuns (change_count) VALUES (0)")
+    run_id = cursor.lastrowid
+
+    # All three change kinds (dossier_created, status_changed, activity_added) in one ordered insert:
+    # per dossier (ingestion order), then by kind, then chronologically, so change_id order is the feed order.
+    cursor.execute("""
+        INSERT INTO ChangeLog (run_id, change_type, dossier_id, activity_hash, old_value, new_value, payload)
+        SELECT ?, change_type, dossier_id, activity_hash, old_value, new_value, payload
+        FROM (
+            SELECT d.rowid as dossier_order, 0 as kind, NULL as activity_date, NULL as activity_id,
+                   'dossier_created' as change_type, d.dossier_id, NULL as activity_hash,
+                   NULL as old_value, d.final_status as new_value,
+                   json_object('title', d.title, 'first_activity_date', d.first_activity_date) as payload
+            FROM Dossiers d
+            WHERE NOT EXISTS (SELECT 1 FROM CdcDossierState s WHERE s.dossier_id = d.dossier_id)
+
+            UNION ALL
+
+            SELECT d.rowid, 1, NULL, NULL,
+                   'status_changed', d.dossier_id, NULL,
+                   s.final_status, d.final_status,
+                   json_object('last_activity_date', d.last_activity_date)
+            FROM Dossiers d
+            JOIN CdcDossierState s ON s.dossier_id = d.dossier_id
+            WHERE s.final_status IS NOT d.final_status
+
+            UNION ALL
+
+            SELECT d.rowid, 2, a.activity_date, a.activity_id,
+                   'activity_added', a.dossier_id, a.activity_hash,
+                   NULL, a.action,
+                   json_object('activity_date', a.activity_date, 'action', a.action, 'actor', a.actor,
+                               'rapporteur', a.rapporteur, 'commission', a.commission, 'publication_source', a.publication_source,
+                               'publication_number', a.publication_number, 'activity_link', a.activity_link)
+            FROM Activities a
+            JOIN Dossiers d ON d.dossier_id = a.dossier_id
+            WHERE NOT EXISTS (SELECT 1 FROM CdcSeenActivities seen WHERE seen.activity_hash = a.activity_hash)
+        )
+        ORDER BY dossier_order, kind, activity_date, activity_id
+    """, (run_id,))
+    change_count = cursor.execute("SELECT COUNT(*) FROM ChangeLog WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    # Advance the state to this run.
+    cursor.execute("DELETE FROM CdcDossierState")
+    cursor.execute("INSERT INTO CdcDossierState (dossier_id, final_status) SELECT dossier_id, final_status FROM Dossiers")
+    cursor.execute("INSERT OR IGNORE INTO CdcSeenActivities (activity_hash) SELECT activity_hash FROM Activities")
+    cursor.execute("UPDATE CdcRuns SET change_count = ? WHERE run_id = ?", (change_count, run_id))
+    conn.commit()
+
+    logging.info(f"CDC run {run_id}: {change_count} changes recorded.")
+    return change_count
+
+
+def read_changes(conn, after_change_id=0, limit=None):
+    """Returns ChangeLog entries with change_id > after_change_id as dicts, in feed order."""
+    query = """
+        SELECT change_id, run_id, change_type, dossier_id, activity_hash, old_value, new_value, payload
+        FROM ChangeLog WHERE change_id > ? ORDER BY change_id
+    """
+    params = [after_change_id]
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    changes = []
+    for change_id, run_id, change_type, dossier_id, activity_hash, old_value, new_value, payload in conn.execute(query, params):
+        changes.append({
+            "change_id": change_id, "run_id": run_id, "type": change_type, "dossier_id": dossier_id,
+            "activity_hash": activity_hash, "old": old_value, "new": new_value,
+            "data": json.loads(payload) if payload else None,
+        })
+    return changes
+
+
+def read_cursor(cursor_path):
+    if not os.path.exists(cursor_path):
+        return 0
+    with open(cursor_path, 'r', encoding='utf-8') as f:
+        return int(f.read().strip() or 0)
+
+
+def write_cursor(cursor_path, change_id):
+    """Writes the cursor atomically so a crash never leaves a half-written position."""
+    tmp_path = f"{cursor_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(change_id))
+    os.replace(tmp_path, cursor_path)
+
+
+def export_changes(db_name, feed_path, cursor_path=None):
+    """
+    Appends every change after the cursor to the JSONL feed and advances the cursor.
+    The cursor only moves once the lines are on disk, so a crash can repeat lines but never lose
+    them; consumers deduplicate on change_id.
+    """
+    cursor_path = cursor_path or f"{feed_path}.cursor"
+    position = read_cursor(cursor_path)
+
+    conn = sqlite3.connect(db_name)
+    create_cdc_tables(conn)
+    changes = read_changes(conn, position)
+    conn.close()
+
+    if not changes:
+        logging.info("No new changes to export.")
+        return 0
+
+    with open(feed_path, 'a', encoding='utf-8') as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    write_cursor(cursor_path, changes[-1]["change_id"])
+
+    logging.info(f"Exported {len(changes)} changes to '{feed_path}'.")
+    return len(changes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export the dossier change feed as JSON lines.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("feed_path", type=str, help="JSONL file the changes are appended to.")
+    parser.add_argument("--cursor", type=str, default=None, help="Cursor file (default: <feed_path>.cursor).")
+
+    args = parser.parse_args()
+    export_changes(args.db_name, args.feed_path, args.cursor)
@@ -0,0 +1,210 @@
+# document_store.py
+import os
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import argparse
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+DEFAULT_STORE_DIR = "documents"
+DEFAULT_CONCURRENCY = 8
+REQUEST_TIMEOUT_SECONDS = 60
+CHUNK_SIZE = 64 * 1024
+# Statuses that will not change by asking again. Such links are skipped unless retry_failed is set.
+PERMANENT_FAILURE_STATUSES = (404, 410)
+
+
+def create_links_table(conn):
+    """Creates the deduplicated Links table. It is kept across rebuilds so download state survives."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS Links (
+        link_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT UNIQUE NOT NULL,
+        sha256 TEXT,
+        content_type TEXT,
+        content_length INTEGER,
+        etag TEXT,
+        last_modified TEXT,
+        http_status INTEGER,
+        fetched_at TEXT
+    )""")
+    conn.commit()
+
+
+def sync_links(conn):
+    """Registers every distinct activity link in Links and points Activities.link_id at it."""
+    logging.info("Synchronizing document links.")
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT OR IGNORE INTO Links (url)
+        SELECT DISTINCT activity_link FROM Activities
+        WHERE activity_link IS NOT NULL AND activity_link != ''
+    """)
+    cursor.execute("""
+        UPDATE Activities
+        SET link_id = Links.link_id
+        FROM Links
+        WHERE Links.url = Activities.activity_link
+    """)
+    conn.commit()
+    link_count = cursor.execute("SELECT COUNT(*) FROM Links").fetchone()[0]
+    logging.info(f"{link_count} distinct document links registered.")
+
+
+def document_path(store_dir, sha256):
+    """Content-addressed location of a document: <store>/objects/ab/cdef..."""
+    return os.path.join(store_dir, "objects", sha256[:2], sha256[2:])
+
+
+def open_document(conn, store_dir, link_id):
+    """Opens the cached bytes of a document by link id. Returns None if it was never downloaded."""
+    row = conn.execute("SELECT sha256 FROM Links WHERE link_id = ?", (link_id,)).fetchone()
+    if not row or not row[0]:
+        return None
+    return open(document_path(store_dir, row[0]), "rb")
+
+
+def normalize_url(url):
+    """Percent-encodes the path (the CHD links contain raw accents such as 'Depôt')."""
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit(parts._replace(path=urllib.parse.quote(parts.path, safe="/%")))
+
+
+def fetch_document(url, store_dir, etag=None, last_modified=None):
+    """
+    Downloads one document into the content-addressed store (blocking; run in a worker thread).
+    Sends conditional headers when validators are known. Returns a dict of Links column values.
+    """
+    request = urllib.request.Request(normalize_url(url))
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if last_modified:
+        request.add_header("If-Modified-Since", last_modified)
+
+    try:
+        response = urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        # 304 Not Modified (the stored copy is still current) or an error status such as 404.
+        return {"http_status": e.code}
+
+    with response:
+        digest = hashlib.sha256()
+        size = 0
+        os.makedirs(store_dir, exist_ok=True)
+        # Stream into a temporary file in the store, then move it to its content address.
+        with tempfile.NamedTemporaryFile(dir=store_dir, prefix=".download-", delete=False) as tmp:
+            try:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                # http.client returns a short body without raising when the connection drops.
+                expected = response.headers.get("Content-Length")
+                if expected is not None and size != int(expected):
+                    raise IOError(f"Incomplete download: received {size} of {expected} bytes")
+            except BaseException:
+                # A broken connection must not leave a partial file behind.
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+
+        sha256 = digest.hexdigest()
+        target = document_path(store_dir, sha256)
+        if os.path.exists(target):
+            os.remove(tmp.name)  # Same content already stored under another URL.
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp.name, target)
+
+        return {
+            "http_status": response.status,
+            "sha256": sha256,
+            "content_type": response.headers.get("Content-Type"),
+            "content_length": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+
+async def _download_all(conn, store_dir, rows, concurrency):
+    """Fetches all rows with at most `concurrency` requests in flight and records the results."""
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"downloaded": 0, "not_modified": 0, "failed": 0}
+
+    async def download(link_id, url, etag, last_modified):
+        async with semaphore:
+            try:
+                result = await asyncio.to_thread(fetch_document, url, store_dir, etag, last_modified)
+            except Exception as e:
+                logging.error(f"Failed to download {url}: {e}")
+                counts["failed"] += 1
+                return
+
+        result["fetched_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        if result["http_status"] == 304:
+            counts["not_modified"] += 1
+        elif "sha256" in result:
+            counts["downloaded"] += 1
+        else:
+            logging.warning(f"HTTP {result['http_status']} for {url}")
+            counts["failed"] += 1
+
+        # Updates run on the event loop thread, so the single SQLite connection is never shared.
+        assignments = ", ".join(f"{column} = ?" for column in result)
+        conn.execute(f"UPDATE Links SET {assignments} WHERE link_id = ?", (*result.values(), link_id))
+        conn.commit()
+
+    await asyncio.gather(*(download(*row) for row in rows))
+    return counts
+
+
+def download_documents(db_name, store_dir=DEFAULT_STORE_DIR, concurrency=DEFAULT_CONCURRENCY,
+                       revalidate=False, limit=None, retry_failed=False):
+    """
+    Downloads missing documents, or revalidates all cached ones when revalidate is set.
+    Links that failed permanently (e.g. 404) are only requested again with retry_failed.
+    """
+    conn = sqlite3.connect(db_name)
+    create_links_table(conn)
+
+    query = "SELECT link_id, url, etag, last_modified FROM Links"
+    conditions = []
+    if not revalidate:
+        conditions.append("sha256 IS NULL")
+    if not retry_failed:
+        conditions.append(f"(http_status IS NULL OR http_status NOT IN ({', '.join(map(str, PERMANENT_FAILURE_STATUSES))}))")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY link_id"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    rows = conn.execute(query).fetchall()
+
+    logging.info(f"Fetching {len(rows)} documents into '{store_dir}' ({concurrency} concurrent requests).")
+    counts = asyncio.run(_download_all(conn, store_dir, rows, concurrency))
+    conn.close()
+    logging.info(f"Document download complete: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Download and cache the documents linked from dossier activities.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("--store", type=str, default=DEFAULT_STORE_DIR, help="Directory of the content-addressed document store.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum number of parallel downloads.")
+    parser.add_argument("--revalidate", action="store_true", help="Re-check cached documents with conditional requests.")
+    parser.add_argument("--limit", type=int, default=None, help="Only fetch this many links (useful for trial runs).")
+    parser.add_argument("--retry_failed", action="store_true", help="Also request links that previously returned 404 or 410.")
+
+    args = parser.parse_args()
+    download_documents(args.db_name, args.store, args.concurrency, args.revalidate, args.limit, args.retry_failed)
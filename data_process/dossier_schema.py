@@ -0,0 +1,199 @@
+# dossier_schema.py
+import os
+import json
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+try:
+    import msgspec
+except ImportError:  # Optional (pip install msgspec): without it files are parsed by json and validated in Python.
+    msgspec = None
+
+
+# Not frozen: frozen dataclasses set every field through object.__setattr__, which doubles construction time.
+# Treat instances as read-only.
+@dataclass(slots=True)
+class Activity:
+    # An activity without a date is kept here and skipped at ingest, like the untyped reader did.
+    date: Optional[str] = None
+    type: str = ""
+    description: str = ""
+    link: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Dossier:
+    dossier_id: str
+    title: Optional[str] = None
+    activities: List[Activity] = field(default_factory=list)
+
+
+class DossierDecodeError(ValueError):
+    """A scraped file that is not valid JSON or does not match the Dossier schema."""
+
+
+# Expected JSON type per field, used by the stdlib fallback. Unknown keys are ignored, as with msgspec.
+ACTIVITY_FIELDS = {"date": ((str, type(None)), False), "type": (str, False), "description": (str, False), "link": ((str, type(None)), False)}
+DOSSIER_FIELDS = {"dossier_id": (str, True), "title": ((str, type(None)), False), "activities": (list, False)}
+
+JSON_TYPE_NAMES = {str: "str", int: "int", float: "float", bool: "bool", list: "array", dict: "object", type(None): "null"}
+
+
+def _check_object(value, fields, path):
+    """Validates one JSON object against fields; error messages follow msgspec's wording."""
+    at = f" - at `{path}`" if path != "$" else ""  # msgspec omits the location for the root object
+    if not isinstance(value, dict):
+        raise DossierDecodeError(f"Expected `object`, got `{JSON_TYPE_NAMES.get(type(value), type(value).__name__)}`{at}")
+    for name, (expected, required) in fields.items():
+        if name not in value:
+            if required:
+                raise DossierDecodeError(f"Object missing required field `{name}`{at}")
+            continue
+        item = value[name]
+        # bool is an int subclass, and null is only allowed where listed.
+        if not isinstance(item, expected) or (isinstance(item, bool) and expected is not bool):
+            expected_names = " | ".join(JSON_TYPE_NAMES[t] for t in (expected if isinstance(expected, tuple) else (expected,)))
+            actual = JSON_TYPE_NAMES.get(type(item), type(item).__name__)
+            raise DossierDecodeError(f"Expected `{expected_names}`, got `{actual}` - at `{path}.{name}`")
+
+
+def _decode_stdlib(raw, build=True):
+    """json.loads plus the schema checks. With build=False the activities are only checked, not built."""
+    try:
+        content = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise DossierDecodeError(f"Invalid JSON: {e}") from None
+
+    if not isinstance(content, dict) or type(content.get("dossier_id")) is not str:
+        _check_object(content, DOSSIER_FIELDS, "$")
+    title, activities = content.get("title"), content.get("activities", [])
+    if (title is not None and type(title) is not str) or type(activities) is not list:
+        _check_object(content, DOSSIER_FIELDS, "$")
+
+    decoded = []
+    for i, activity in enumerate(activities):
+        # Fast path: one exact type test per field. The detailed check only runs to word the error.
+        if type(activity) is not dict:
+            _check_object(activity, ACTIVITY_FIELDS, f"$.activities[{i}]")
+        date, text = activity.get("date"), activity.get("type", "")
+        description, link = activity.get("description", ""), activity.get("link")
+        if not (type(text) is str and type(description) is str and (date is None or type(date) is str) and (link is None or type(link) is str)):
+            _check_object(activity, ACTIVITY_FIELDS, f"$.activities[{i}]")
+        if build:
+            decoded.append(Activity(date, text, description, link))
+    return Dossier(content["dossier_id"], title, decoded)
+
+
+if msgspec is not None:
+    # msgspec decodes straight into the dataclasses and validates types in the same pass.
+    _decoder = msgspec.json.Decoder(Dossier)
+
+    # The same schema as structs, for the validation pass: msgspec builds them faster than dataclasses,
+    # and the result is thrown away. Error messages are identical since the field names and types are.
+    class _ActivityCheck(msgspec.Struct, gc=False):
+        date: Optional[str] = None
+        type: str = ""
+        description: str = ""
+        link: Optional[str] = None
+
+    class _DossierCheck(msgspec.Struct, gc=False):
+        dossier_id: str
+        title: Optional[str] = None
+        activities: List[_ActivityCheck] = []
+
+    _checker = msgspec.json.Decoder(_DossierCheck)
+
+    def _decode_fast(raw, decoder=_decoder):
+        try:
+            return decoder.decode(raw)
+        except msgspec.DecodeError as e:  # ValidationError is a subclass
+            raise DossierDecodeError(str(e)) from None
+
+    _decode = _decode_fast
+    _check = lambda raw: _decode_fast(raw, _checker)
+    DECODER_NAME = "msgspec"
+else:
+    _decode = _decode_stdlib
+    _check = lambda raw: _decode_stdlib(raw, build=False)
+    DECODER_NAME = "json (stdlib)"
+
+
+def _require_id(dossier):
+    if not dossier.dossier_id.strip():
+        raise DossierDecodeError("Expected a non-empty `dossier_id` - at `$.dossier_id`")
+    return dossier
+
+
+def decode_dossier(raw):
+    """Decodes the bytes of one scraped file into a Dossier. Raises DossierDecodeError."""
+    return _require_id(_decode(raw))
+
+
+def load_dossier(file_path):
+    with open(file_path, 'rb') as f:
+        return decode_dossier(f.read())
+
+
+def validate_files(file_paths):
+    """
+    Validates every file without keeping the results. Returns {file_path: error message}, so schema
+    problems are known before anything is written; callers then decode batch by batch with load_dossier.
+    """
+    errors = {}
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'rb') as f:
+                _require_id(_check(f.read()))
+        except (DossierDecodeError, OSError) as e:
+            errors[file_path] = str(e)
+    return errors
+
+
+def benchmark(file_paths, repeat=3):
+    """
+    Best-of-repeat seconds for json.load into dicts (the old ingest) versus the typed ingest path,
+    which validates every file first and decodes it again batch by batch. Files are read in all runs.
+    """
+    def untyped():
+        for file_path in file_paths:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                json.load(f)
+
+    def validate():
+        validate_files(file_paths)
+
+    def ingest():
+        errors = validate_files(file_paths)
+        for file_path in file_paths:
+            if file_path not in errors:
+                load_dossier(file_path)
+
+    results = {}
+    for name, run in [("json.load", untyped), (f"validate ({DECODER_NAME})", validate), (f"validate + decode ({DECODER_NAME})", ingest)]:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate scraped dossier files and benchmark typed decoding against json.load.")
+    parser.add_argument("json_path", type=str, help="Path to the folder containing the scraped JSON files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per decoder; the best time is reported.")
+
+    args = parser.parse_args()
+
+    file_paths = sorted(os.path.join(args.json_path, name) for name in os.listdir(args.json_path) if name.endswith(".json"))
+    errors = validate_files(file_paths)
+    for file_path, error in errors.items():
+        print(f"{os.path.basename(file_path)}: {error}")
+    print(f"{len(file_paths) - len(errors)} valid, {len(errors)} invalid files")
+
+    total_mb = sum(os.path.getsize(file_path) for file_path in file_paths) / 1e6
+    for name, seconds in benchmark(file_paths, args.repeat).items():
+        print(f"{name:>34}: {seconds:.3f}s ({len(file_paths) / seconds:.0f} files/s, {total_mb / seconds:.1f} MB/s)")
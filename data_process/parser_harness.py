@@ -0,0 +1,199 @@
+# parser_harness.py
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+import importlib
+from collections import Counter
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+DEFAULT_SCRAPE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scrape")
+
+
+# --- Parser Adapters ---
+# Each adapter feeds raw activities to one script's parse_activity_details exactly the way that
+# script does it (its own unfurling and arguments), and names the field holding the action.
+
+def _v4_events(module, activity):
+    return [event.strip() for event in module.split_sub_events(activity.get("type", "")) if event.strip()]
+
+def _v3_events(module, activity):
+    return [event for event in module.split_sub_events(activity.get("type", "")) if event.strip()]
+
+def _example_events(module, activity):
+    # process_example_dossiers.py parses the whole type field as one event.
+    return [activity.get("type", "")]
+
+def _example_parse(module, event_text, dossier_id):
+    return module.parse_activity_details(event_text, module.clean_text(event_text), dossier_id)
+
+def _default_parse(module, event_text, dossier_id):
+    return module.parse_activity_details(event_text, dossier_id)
+
+PARSERS = {
+    "v4": {"module": "process_dossiers_v4", "events": _v4_events, "parse": _default_parse, "action_field": "action"},
+    "v3": {"module": "process_dossiers", "events": _v3_events, "parse": _default_parse, "action_field": "extracted_action_detail"},
+    "example": {"module": "process_example_dossiers", "events": _example_events, "parse": _example_parse, "action_field": "extracted_action_detail"},
+}
+
+
+def golden_path(parser_name, golden_dir=GOLDEN_DIR):
+    return os.path.join(golden_dir, f"{parser_name}.jsonl.gz")
+
+
+def iter_corpus(scrape_path):
+    """Yields (file_name, dossier_id, activities) for every JSON file, in dossier id order."""
+    from process_dossiers_v4 import find_json_files
+
+    for file_path in find_json_files(scrape_path):
+        file_name = os.path.basename(file_path)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"Skipping {file_name} due to a JSON decoding error.")
+            continue
+        yield file_name, content.get("dossier_id"), content.get("activities", [])
+
+
+def run_parser(parser_name, scrape_path):
+    """
+    Runs one parser over the corpus. Returns (records, stats), where records maps
+    'file:activity_index:event_index' to the parser's output dict.
+    """
+    adapter = PARSERS[parser_name]
+    module = importlib.import_module(adapter["module"])
+    parse, events_of = adapter["parse"], adapter["events"]
+
+    records = {}
+    activity_count, total_seconds = 0, 0.0
+    worst_seconds, worst_key = 0.0, None
+
+    for file_name, dossier_id, activities in iter_corpus(scrape_path):
+        for activity_index, activity in enumerate(activities):
+            # Latency covers unfurling plus parsing of every sub-event of one raw activity.
+            start = time.perf_counter()
+            events = events_of(module, activity)
+            parsed = [parse(module, event_text, dossier_id) for event_text in events]
+            elapsed = time.perf_counter() - start
+
+            activity_count += 1
+            total_seconds += elapsed
+            if elapsed > worst_seconds:
+                worst_seconds, worst_key = elapsed, f"{file_name}:{activity_index}"
+
+            for event_index, details in enumerate(parsed):
+                records[f"{file_name}:{activity_index}:{event_index}"] = details
+
+    stats = {
+        "activities": activity_count,
+        "events": len(records),
+        "parse_seconds": total_seconds,
+        "activities_per_second": activity_count / total_seconds if total_seconds else 0.0,
+        "worst_latency_ms": worst_seconds * 1000,
+        "worst_activity": worst_key,
+    }
+    return records, stats
+
+
+def write_golden(path, records):
+    """Writes records as sorted JSON lines. gzip mtime is pinned so unchanged output is byte-identical."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+        for key in records:
+            line = json.dumps({"key": key, **records[key]}, ensure_ascii=False, sort_keys=True)
+            f.write(line.encode('utf-8') + b"\n")
+
+
+def read_golden(path):
+    records = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            records[record.pop("key")] = record
+    return records
+
+
+def diff_records(golden, current, action_field):
+    """Compares two record sets per field and per (golden) action."""
+    field_diffs, action_diffs, examples = Counter(), Counter(), []
+
+    missing = [key for key in golden if key not in current]
+    extra = [key for key in current if key not in golden]
+
+    for key, expected in golden.items():
+        actual = current.get(key)
+        if actual is None:
+            continue
+        changed = [field for field in expected.keys() | actual.keys() if expected.get(field) != actual.get(field)]
+        if not changed:
+            continue
+        action_diffs[expected.get(action_field)] += 1
+        for field in changed:
+            field_diffs[field] += 1
+            examples.append((key, field, expected.get(field), actual.get(field)))
+
+    return {"missing": missing, "extra": extra, "fields": field_diffs, "actions": action_diffs, "examples": examples}
+
+
+def print_report(parser_name, stats, diff=None, show=10):
+    print(f"\n--- Parser '{parser_name}' ---")
+    print(f"Activities parsed: {stats['activities']} ({stats['events']} events)")
+    print(f"Throughput: {stats['activities_per_second']:.0f} activities/s")
+    print(f"Worst-case latency: {stats['worst_latency_ms']:.2f} ms ({stats['worst_activity']})")
+
+    if diff is None:
+        return
+
+    changed = sum(diff["actions"].values())
+    if not (changed or diff["missing"] or diff["extra"]):
+        print("Output matches the golden results.")
+        return
+
+    print(f"Changed events: {changed}, missing: {len(diff['missing'])}, extra: {len(diff['extra'])}")
+    print("Differences per field:")
+    for field, count in diff["fields"].most_common():
+        print(f"  {field}: {count}")
+    print("Differences per golden action:")
+    for action, count in diff["actions"].most_common():
+        print(f"  {action}: {count}")
+    for key, field, expected, actual in diff["examples"][:show]:
+        print(f"  {key} {field}: {expected!r} -> {actual!r}")
+
+
+def main(parser_names, scrape_path, update=False, show=10):
+    """Runs each parser, then either refreshes its golden file or diffs against it. Returns an exit code."""
+    exit_code = 0
+    for parser_name in parser_names:
+        records, stats = run_parser(parser_name, scrape_path)
+        path = golden_path(parser_name)
+
+        if update or not os.path.exists(path):
+            write_golden(path, records)
+            print_report(parser_name, stats)
+            print(f"Golden results written to {path}")
+            continue
+
+        diff = diff_records(read_golden(path), records, PARSERS[parser_name]["action_field"])
+        print_report(parser_name, stats, diff, show)
+        if diff["actions"] or diff["missing"] or diff["extra"]:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Golden-output regression and throughput harness for the activity parsers.")
+    # No `choices` here: argparse checks a list default against them as a whole and rejects it.
+    parser.add_argument("parsers", nargs="*", help=f"Parsers to run: {', '.join(PARSERS)} (default: all).")
+    parser.add_argument("--scrape", type=str, default=DEFAULT_SCRAPE_PATH, help="Folder with the scraped dossier JSON files.")
+    parser.add_argument("--update", action="store_true", help="Accept the current output as the new golden results.")
+    parser.add_argument("--show", type=int, default=10, help="Number of example differences to print.")
+
+    args = parser.parse_args()
+    unknown = [name for name in args.parsers if name not in PARSERS]
+    if unknown:
+        parser.error(f"unknown parser(s) {', '.join(unknown)}; choose from {', '.join(PARSERS)}")
+    sys.exit(main(args.parsers or list(PARSERS), args.scrape, args.update, args.show))
@@ -6,28 +6,15 @@ from datetime import datetime
 import re
 import hashlib
 
+from text_cleaning import make_cleaner
+
 # --- Configuration ---
 # IMPORTANT: Update this path to your local folder containing the JSON files
 JSON_FILES_PATH = r"C:\Users\mmosavat\workspace\GovTechLab-Hackathon-1\scrape"
 DATABASE_NAME = "dossier_activities_v3.db"
 
-def clean_text(text_str):
-    """General purpose text cleaner."""
-    if not text_str:
-        return ""
-    # Clean dossier/sub-id prefixes like '4469/2'
-    cleaned_str = re.sub(r"^\d{4,}/\d+\s*\n", "", text_str)
-    # Remove known boilerplate
-    boilerplate = [
-        r"Bouton graphique servant à afficher ou cacher tous les éléments de la liste qui précède",
-        r"Show more",
-        r"Voir moins"
-    ]
-    for pattern in boilerplate:
-        cleaned_str = re.sub(pattern, "", cleaned_str, flags=re.IGNORECASE)
-    # Standardize whitespace
-    cleaned_str = re.sub(r'\s+', ' ', cleaned_str).strip()
-    return cleaned_str
+# General purpose text cleaner: dossier prefix, boilerplate and whitespace in one pass.
+clean_text = make_cleaner(strip_dossier_prefix=True)
 
 def parse_activity_details(activity_text, dossier_id):
     """
@@ -122,6 +109,16 @@ def setup_database():
     conn.commit()
     return conn
 
+def split_sub_events(activity_type_raw):
+    """Unfurls multi-event activities ('1) ... 2) ...') into individual event texts."""
+    # ** Unfurling Logic for Multi-Event Activities **
+    sub_events = re.findall(r"\d+\)\s(.*?)(?=\s*\d+\)|$)", activity_type_raw, re.DOTALL)
+
+    if not sub_events:
+        # If no numbered list, treat the whole type as a single event
+        sub_events = [activity_type_raw]
+    return sub_events
+
 def process_and_insert_data(conn, file_name, json_content):
     """Processes a single JSON file, unfurls multi-events, and handles duplicates."""
     cursor = conn.cursor()
@@ -139,15 +136,7 @@ def process_and_insert_data(conn, file_name, json_content):
         activity_description = activity.get("description", "")
         activity_link = activity.get("link")
 
-        # ** Unfurling Logic for Multi-Event Activities **
-        # Check for patterns like '1) ... 2) ...'
-        sub_events = re.findall(r"\d+\)\s(.*?)(?=\s*\d+\)|$)", activity_type_raw, re.DOTALL)
-
-        if not sub_events:
-            # If no numbered list, treat the whole type as a single event
-            sub_events = [activity_type_raw]
-
-        for event_text in sub_events:
+        for event_text in split_sub_events(activity_type_raw):
             if not event_text.strip(): continue
 
             cleaned_event_text = clean_text(event_text)
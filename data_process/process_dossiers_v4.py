@@ -1,6 +1,5 @@
 # process_dossiers_v4.py
 import os
-import json
 import sqlite3
 import hashlib
 import logging
@@ -8,6 +7,16 @@ import argparse
 import re
 from datetime import datetime
 
+from snapshot import run_snapshot_build, MAX_ROW_DROP
+from document_store import create_links_table, sync_links
+from rollups import create_rollup_tables, update_rollups
+from text_store import create_text_tables, intern_text, compress_texts
+from cdc import create_cdc_tables, capture_changes, export_changes
+from text_cleaning import make_cleaner
+from workload_timelines import build_workload_timelines
+from dossier_schema import DECODER_NAME, DossierDecodeError, load_dossier, validate_files
+from publish_api import publish, PUBLISH_SUPPORTED
+
 # --- Configuration for Logging ---
 # Sets up logging to file and console for better tracking and debugging.
 logging.basicConfig(
@@ -31,21 +40,39 @@ ACTION_PATTERNS = {
     "Rapport de commission": r"Rapport (?:complémentaire )?de commission",
     "Prise de position": r"Prise de position",
     "Avis": r"Avis (?:de|du)",
-    "Dépôt": r"Déposé par",
+    "Dépôt": r"^Déposé\b",
     "Nomination de rapporteur": r"Rapporteur(s)?:",
 }
 
-def setup_database(db_name):
-    """Sets up the database, dropping old tables for a clean run."""
+# Stage name for opinions of the Conseil d'Etat, derived from 'Avis' activities by their actor.
+COUNCIL_OF_STATE_STAGE = "Avis du Conseil d'Etat"
+
+# Number of dossier files committed together with their checkpoint rows.
+DEFAULT_BATCH_SIZE = 100
+
+def setup_database(db_name, resume=False):
+    """
+    Sets up the database, dropping old tables for a clean run.
+    With resume=True the existing tables and their committed progress are kept.
+    """
     logging.info(f"Setting up database: {db_name}")
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
-    # Drop tables to ensure a fresh start
-    cursor.execute("DROP TABLE IF EXISTS Activities")
-    cursor.execute("DROP TABLE IF EXISTS Dossiers")
+    if not resume:
+        # Drop tables to ensure a fresh start
+        cursor.execute("DROP TABLE IF EXISTS IngestProgress")
+        cursor.execute("DROP TABLE IF EXISTS StageDurations")
+        cursor.execute("DROP VIEW IF EXISTS ActivitiesWithText")
+        cursor.execute("DROP TABLE IF EXISTS Activities")
+        cursor.execute("DROP TABLE IF EXISTS Dossiers")
+    # Links and the CDC tables are not dropped: they carry state from one run to the next.
+    create_links_table(conn)
+    create_cdc_tables(conn)
+    # Rollups are derived from Activities, so they restart with it.
+    create_rollup_tables(conn, reset=not resume)
 
     cursor.execute("""
-    CREATE TABLE Dossiers (
+    CREATE TABLE IF NOT EXISTS Dossiers (
         dossier_id TEXT PRIMARY KEY,
         title TEXT,
         first_activity_date DATE,
@@ -56,32 +83,56 @@ def setup_database(db_name):
     )""")
 
     cursor.execute("""
-    CREATE TABLE Activities (
+    CREATE TABLE IF NOT EXISTS Activities (
         activity_id INTEGER PRIMARY KEY AUTOINCREMENT,
         dossier_id TEXT,
         activity_date DATE NOT NULL,
-        activity_text TEXT,
+        text_id INTEGER,
         activity_link TEXT,
         activity_hash TEXT UNIQUE,
         action TEXT,
         actor TEXT,
         rapporteur TEXT,
+        commission TEXT,
         vote_outcome TEXT,
         publication_source TEXT,
         publication_number TEXT,
         publication_page TEXT,
+        link_id INTEGER,
+        FOREIGN KEY (dossier_id) REFERENCES Dossiers (dossier_id),
+        FOREIGN KEY (text_id) REFERENCES ActivityTexts (text_id),
+        FOREIGN KEY (link_id) REFERENCES Links (link_id)
+    )""")
+    # Activity texts are interned (and later compressed) in ActivityTexts; see text_store.py.
+    create_text_tables(conn, reset=not resume)
+
+    # Derived table: one row per (dossier, from_action, to_action) pair of first occurrences,
+    # stored only in chronological direction (to_date >= from_date).
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS StageDurations (
+        dossier_id TEXT,
+        from_action TEXT,
+        to_action TEXT,
+        from_date DATE,
+        to_date DATE,
+        duration_days INTEGER,
+        PRIMARY KEY (dossier_id, from_action, to_action),
         FOREIGN KEY (dossier_id) REFERENCES Dossiers (dossier_id)
     )""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_durations_pair ON StageDurations (from_action, to_action)")
+
+    # Checkpoint table: a file is listed here only once all of its rows are committed.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS IngestProgress (
+        file_name TEXT PRIMARY KEY,
+        dossier_id TEXT,
+        committed_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""")
     conn.commit()
     return conn
 
-def clean_text(text):
-    """General purpose text cleaner."""
-    if not text:
-        return ""
-    # Standardize whitespace and remove leading/trailing spaces
-    cleaned = re.sub(r'\s+', ' ', text).strip()
-    return cleaned
+# General purpose text cleaner: strips scraper boilerplate and standardizes whitespace.
+clean_text = make_cleaner()
 
 def convert_date_format(date_str, input_format="%d.%m.%Y"):
     """Converts date from DD.MM.YYYY to YYYY-MM-DD, handling potential errors."""
@@ -98,7 +149,7 @@ def parse_activity_details(activity_text, dossier_id):
     Parses a single activity text to extract structured details using regex and configured patterns.
     """
     details = {
-        "activity_event_date": None, "action": None, "actor": None, "rapporteur": None,
+        "activity_event_date": None, "action": None, "actor": None, "rapporteur": None, "commission": None,
         "vote_outcome": None, "publication_source": None, "publication_number": None, "publication_page": None
     }
 
@@ -121,6 +172,12 @@ def parse_activity_details(activity_text, dossier_id):
     if rapporteur_match:
         details["rapporteur"] = clean_text(rapporteur_match.group(1))
 
+    # 3b. Extract Commission(s), e.g. "Renvoyé en commission(s) : Commission juridique"
+    # Several commissions are listed on one line, separated by "; ".
+    commission_match = re.search(r"commission\(s\)\s*:\s*([^\n]+)", activity_text, re.IGNORECASE)
+    if commission_match:
+        details["commission"] = clean_text(commission_match.group(1)) or None
+
     # 4. Extract Vote Outcome
     vote_match = re.search(r"vote constitutionnel\s*\((.*?)\)", activity_text, re.IGNORECASE)
     if vote_match:
@@ -141,31 +198,31 @@ def parse_activity_details(activity_text, dossier_id):
     return details
 
 
-def process_and_insert_data(conn, file_name, json_content):
-    """Processes a single JSON file, unfurls multi-part events, and inserts into the database."""
+def split_sub_events(activity_type_raw):
+    """Unfurls activities that are numbered lists (e.g., "1) ... 2) ...") into individual event texts."""
+    # The regex looks for a number followed by a parenthesis, capturing everything until the next one or the end.
+    sub_events = re.split(r'\n\s*\d+\)\s*', '\n' + activity_type_raw)[1:]
+    if not sub_events:
+        sub_events = [activity_type_raw] # Treat as a single event if not a numbered list
+    return sub_events
+
+
+def process_and_insert_data(conn, dossier):
+    """Processes one decoded dossier (see dossier_schema.py), unfurls multi-part events, and inserts into the database."""
     cursor = conn.cursor()
-    dossier_id = json_content.get("dossier_id")
-    if not dossier_id:
-        logging.warning(f"Skipping file {file_name}: no dossier_id found.")
-        return
+    dossier_id = dossier.dossier_id
 
     processed_hashes = set()
 
-    for activity in json_content.get("activities", []):
-        original_date = convert_date_format(activity.get("date"))
+    for activity in dossier.activities:
+        original_date = convert_date_format(activity.date)
         if not original_date:
             continue
 
-        activity_type_raw = activity.get("type", "")
-        activity_link = activity.get("link")
-
-        # Unfurling Logic: Split activities that are numbered lists (e.g., "1) ... 2) ...")
-        # The regex looks for a number followed by a parenthesis, capturing everything until the next one or the end.
-        sub_events = re.split(r'\n\s*\d+\)\s*', '\n' + activity_type_raw)[1:]
-        if not sub_events:
-            sub_events = [activity_type_raw] # Treat as a single event if not a numbered list
+        activity_type_raw = activity.type
+        activity_link = activity.link
 
-        for event_text in sub_events:
+        for event_text in split_sub_events(activity_type_raw):
             event_text = event_text.strip()
             if not event_text:
                 continue
@@ -181,23 +238,21 @@ def process_and_insert_data(conn, file_name, json_content):
             final_date = details.get("activity_event_date") or original_date
 
             try:
+                text_id = intern_text(cursor, event_text)
                 cursor.execute("""
                     INSERT INTO Activities (
-                        dossier_id, activity_date, activity_text, activity_link, activity_hash,
-                        action, actor, rapporteur, vote_outcome, publication_source, publication_number, publication_page
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        dossier_id, activity_date, text_id, activity_link, activity_hash,
+                        action, actor, rapporteur, commission, vote_outcome, publication_source, publication_number, publication_page
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
-                    dossier_id, final_date, event_text, activity_link, activity_hash,
-                    details["action"], details["actor"], details["rapporteur"], details["vote_outcome"],
+                    dossier_id, final_date, text_id, activity_link, activity_hash,
+                    details["action"], details["actor"], details["rapporteur"], details["commission"], details["vote_outcome"],
                     details["publication_source"], details["publication_number"], details["publication_page"]
                 ))
             except sqlite3.IntegrityError:
                 # This catches duplicates from previous runs (hash already exists in DB)
                 logging.debug(f"Skipping duplicate activity for dossier {dossier_id} (hash: {activity_hash[:8]}...).")
-            except Exception as e:
-                logging.error(f"Error inserting activity for dossier {dossier_id}: {e}")
-
-    conn.commit()
+            # Any other error propagates, so ingest_dossier rolls back the whole file.
 
 
 def post_process_dossiers(conn):
@@ -247,48 +302,201 @@ def post_process_dossiers(conn):
         logging.error(f"Failed to post-process dossiers: {e}", exc_info=True)
 
 
-def main(json_path, db_name):
-    """Main function to find JSON files, process them, and populate the database."""
-    conn = setup_database(db_name)
+def build_stage_durations(conn):
+    """
+    Rebuilds the StageDurations table in one window-function pass over Activities.
+    The first date of each stage per dossier is paired with every later stage of the same dossier,
+    so lifecycle questions (e.g. 'Dépôt' -> "Avis du Conseil d'Etat") become simple lookups.
+    Stages on the same day are ordered by activity_id, so each pair is stored in one direction only.
+    Stages are the actions, plus COUNCIL_OF_STATE_STAGE for 'Avis' activities of the Conseil d'Etat;
+    that stage is not paired with 'Avis', which is derived from the same activities.
+    """
+    logging.info("Building stage duration table.")
+    cursor = conn.cursor()
+
+    build_query = """
+    WITH Stages AS (
+        SELECT dossier_id, action, activity_date, activity_id
+        FROM Activities
+        WHERE action IS NOT NULL
+        UNION ALL
+        SELECT dossier_id, :council_stage, activity_date, activity_id
+        FROM Activities
+        WHERE action = 'Avis' AND (actor LIKE 'Conseil d''Etat%' OR actor LIKE 'Conseil d''État%')
+    ),
+    RankedActivities AS (
+        SELECT
+            dossier_id,
+            action,
+            activity_date,
+            activity_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY dossier_id, action
+                ORDER BY activity_date, activity_id
+            ) as occurrence
+        FROM Stages
+    ),
+    FirstDates AS (
+        SELECT dossier_id, action, activity_date as first_date, activity_id as first_id
+        FROM RankedActivities
+        WHERE occurrence = 1
+    )
+    INSERT INTO StageDurations (dossier_id, from_action, to_action, from_date, to_date, duration_days)
+    SELECT
+        f.dossier_id,
+        f.action,
+        t.action,
+        f.first_date,
+        t.first_date,
+        CAST(julianday(t.first_date) - julianday(f.first_date) AS INTEGER)
+    FROM FirstDates AS f
+    JOIN FirstDates AS t ON t.dossier_id = f.dossier_id
+    WHERE (t.first_date, t.first_id) > (f.first_date, f.first_id)
+      AND NOT (f.action = 'Avis' AND t.action = :council_stage)
+      AND NOT (f.action = :council_stage AND t.action = 'Avis');
+    """
+    try:
+        cursor.execute("DELETE FROM StageDurations")
+        cursor.execute(build_query, {"council_stage": COUNCIL_OF_STATE_STAGE})
+        conn.commit()
+        # rowcount is not reported for CTE-prefixed statements, so count explicitly.
+        row_count = cursor.execute("SELECT COUNT(*) FROM StageDurations").fetchone()[0]
+        logging.info(f"Stored {row_count} stage duration rows.")
+    except Exception as e:
+        logging.error(f"Failed to build stage durations: {e}", exc_info=True)
+
+
+def create_indexes(conn):
+    """Creates the lookup indexes used by post-processing and analysis. Built after bulk inserts."""
+    cursor = conn.cursor()
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activities_dossier_date ON Activities (dossier_id, activity_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activities_action ON Activities (action)")
+    conn.commit()
+
 
+def finalize_database(conn):
+    """Runs every step that derives data from the inserted activities."""
+    create_indexes(conn)
+    post_process_dossiers(conn)
+    build_stage_durations(conn)
+    build_workload_timelines(conn)
+    sync_links(conn)
+    update_rollups(conn)
+    compress_texts(conn)
+    capture_changes(conn)
+
+
+def dossier_sort_key(file_path):
+    """Orders files by numeric dossier id (taken from the file name) so builds are reproducible."""
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return (0, int(stem), file_path) if stem.isdigit() else (1, 0, file_path)
+
+
+def find_json_files(json_path):
+    """Returns all JSON files below json_path, ordered by dossier id."""
     logging.info(f"Scanning for JSON files in: {json_path}")
     json_files = [os.path.join(root, file)
                   for root, _, files in os.walk(json_path)
                   for file in files if file.endswith('.json')]
+    return sorted(json_files, key=dossier_sort_key)
 
-    if not json_files:
-        logging.warning("No JSON files found in the specified directory. Exiting.")
-        return
 
-    logging.info(f"Found {len(json_files)} JSON files. Starting processing...")
+def ingest_dossier(conn, file_path, dossier):
+    """
+    Inserts one decoded dossier and its activities inside a savepoint, together with its
+    IngestProgress row. A failing file is rolled back as a whole.
+    The caller owns the surrounding transaction (see ingest_files).
+    """
+    file_name = os.path.basename(file_path)
+    dossier_id = dossier.dossier_id
+
+    cursor = conn.cursor()
+    cursor.execute("SAVEPOINT dossier_file")
+    try:
+        # Insert the dossier first to satisfy foreign key constraints.
+        cursor.execute("INSERT OR IGNORE INTO Dossiers (dossier_id, title, file_name) VALUES (?, ?, ?)", (dossier_id, dossier.title, file_name))
+        process_and_insert_data(conn, dossier)
+        cursor.execute("INSERT OR REPLACE INTO IngestProgress (file_name, dossier_id) VALUES (?, ?)", (file_name, dossier_id))
+        cursor.execute("RELEASE dossier_file")
+    except Exception as e:
+        cursor.execute("ROLLBACK TO dossier_file")
+        cursor.execute("RELEASE dossier_file")
+        logging.error(f"  -> An unexpected error occurred with {file_name}; the file was rolled back and is retried by --resume: {e}", exc_info=True)
 
-    for i, file_path in enumerate(json_files):
-        file_name = os.path.basename(file_path)
-        logging.info(f"Processing file {i+1}/{len(json_files)}: {file_name}")
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-            
-            dossier_id = content.get("dossier_id")
-            title = content.get("title")
-            if not dossier_id:
-                logging.warning(f"  -> Skipping {file_name} due to missing 'dossier_id'.")
+
+def ingest_files(conn, json_files, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Ingests files in batches; each batch and its progress rows are committed in one transaction.
+    A first pass validates every file, so schema errors are reported before any insert. Only the
+    current batch is decoded and held in memory.
+    """
+    logging.info(f"Validating {len(json_files)} files ({DECODER_NAME} decoder).")
+    errors = validate_files(json_files)
+    for file_path, error in errors.items():
+        logging.error(f"  -> Skipping {os.path.basename(file_path)}: {error}")
+    if errors:
+        logging.warning(f"{len(errors)} of {len(json_files)} files failed schema validation and will be skipped.")
+    valid_files = [file_path for file_path in json_files if file_path not in errors]
+
+    for start in range(0, len(valid_files), batch_size):
+        batch = valid_files[start:start + batch_size]
+        conn.execute("BEGIN")
+        for i, file_path in enumerate(batch, start=start + 1):
+            logging.info(f"Processing file {i}/{len(valid_files)}: {os.path.basename(file_path)}")
+            try:
+                dossier = load_dossier(file_path)
+            except (DossierDecodeError, OSError) as e:
+                # The file changed or vanished since validation.
+                logging.error(f"  -> Skipping {os.path.basename(file_path)}: {e}")
                 continue
+            ingest_dossier(conn, file_path, dossier)
+        conn.commit()
+        logging.info(f"Checkpoint: {start + len(batch)}/{len(valid_files)} files committed.")
+
+
+def completed_files(conn):
+    """File names whose dossiers were fully committed by an earlier run."""
+    return {row[0] for row in conn.execute("SELECT file_name FROM IngestProgress")}
+
+
+def build_database(json_files, db_name, resume=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Processes the given JSON files into db_name, skipping already committed files when resuming."""
+    conn = setup_database(db_name, resume)
 
-            # Insert the dossier first to satisfy foreign key constraints.
-            conn.cursor().execute("INSERT OR IGNORE INTO Dossiers (dossier_id, title, file_name) VALUES (?, ?, ?)", (dossier_id, title, file_name))
-            conn.commit()
+    if resume:
+        done = completed_files(conn)
+        json_files = [path for path in json_files if os.path.basename(path) not in done]
+        logging.info(f"Resuming: {len(done)} files already committed, {len(json_files)} remaining.")
 
-            process_and_insert_data(conn, file_name, content)
-        except json.JSONDecodeError:
-            logging.error(f"  -> Skipping {file_name} due to a JSON decoding error.")
-        except Exception as e:
-            logging.error(f"  -> An unexpected error occurred with {file_name}: {e}", exc_info=True)
+    logging.info(f"Found {len(json_files)} JSON files. Starting processing...")
+    ingest_files(conn, json_files, batch_size)
 
     logging.info("Initial data insertion complete.")
-    post_process_dossiers(conn)
+    finalize_database(conn)
 
     conn.close()
+
+
+def main(json_path, db_name, snapshot=False, keep_snapshots=3, cdc_feed=None, resume=False, batch_size=DEFAULT_BATCH_SIZE, publish_dir=None, max_row_drop=MAX_ROW_DROP):
+    """Main function to find JSON files, process them, and populate the database."""
+    json_files = find_json_files(json_path)
+
+    if not json_files:
+        logging.warning("No JSON files found in the specified directory. Exiting.")
+        return
+
+    if snapshot:
+        # Build off to the side and swap in atomically, so readers never see a partial database.
+        run_snapshot_build(db_name, lambda build_path: build_database(json_files, build_path, batch_size=batch_size), keep_snapshots, max_row_drop)
+    else:
+        build_database(json_files, db_name, resume, batch_size)
+
+    if cdc_feed:
+        export_changes(db_name, cdc_feed)
+
+    if publish_dir:
+        publish(db_name, publish_dir)
+
     logging.info("--- Database processing complete! ---")
     logging.info(f"Data is stored in '{db_name}'.")
 
@@ -298,12 +506,23 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process parliamentary dossier JSON files into a SQLite database.")
     parser.add_argument("json_path", type=str, help="Path to the root folder containing the JSON files.")
     parser.add_argument("--db_name", type=str, default="dossiers_v4.db", help="Name for the output SQLite database file.")
+    parser.add_argument("--snapshot", action="store_true", help="Build into a temporary file and atomically swap it in when valid.")
+    parser.add_argument("--keep_snapshots", type=int, default=3, help="Number of previous databases kept for rollback in snapshot mode.")
+    parser.add_argument("--max_row_drop", type=float, default=MAX_ROW_DROP, help="Largest allowed shrink of dossiers/activities versus the live database in snapshot mode (0.1 = 10%%).")
+    parser.add_argument("--cdc_feed", type=str, default=None, help="Append this run's changes to a JSONL feed (cursor kept in <feed>.cursor).")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run, skipping dossiers that were already committed.")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help="Number of dossier files committed per checkpoint.")
+    parser.add_argument("--publish_dir", type=str, default=None, help="Write prebuilt, precompressed API artifacts to this directory (POSIX only).")
     
     args = parser.parse_args()
 
     # Check if the provided path exists
     if not os.path.isdir(args.json_path):
         logging.error(f"Error: The specified path '{args.json_path}' does not exist or is not a directory.")
+    elif args.resume and args.snapshot:
+        logging.error("Error: --resume continues the live database and cannot be combined with --snapshot.")
+    elif args.publish_dir and not PUBLISH_SUPPORTED:
+        logging.error("Error: --publish_dir switches a symlink and is not supported on Windows.")
     else:
-        main(args.json_path, args.db_name)
+        main(args.json_path, args.db_name, args.snapshot, args.keep_snapshots, args.cdc_feed, args.resume, args.batch_size, args.publish_dir, args.max_row_drop)
 
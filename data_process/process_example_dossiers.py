@@ -5,6 +5,8 @@ import os
 from datetime import datetime
 import re
 
+from text_cleaning import make_cleaner
+
 # --- Configuration ---
 GITHUB_REPO_OWNER = "your_username"
 GITHUB_REPO_NAME = "your_repo_name"
@@ -38,19 +40,7 @@ def convert_date_format(date_str, input_format="%d.%m.%Y"):
         print(f"Warning: Could not parse date '{date_str}' with format '{input_format}'.")
         return None
 
-def clean_text(text_str):
-    if not text_str:
-        return ""
-    boilerplate = [
-        r"Bouton graphique servant à afficher ou cacher tous les éléments de la liste qui précède",
-        r"Show more",
-        r"Voir moins"
-    ]
-    cleaned_str = text_str
-    for pattern in boilerplate:
-        cleaned_str = re.sub(pattern, "", cleaned_str, flags=re.IGNORECASE)
-    cleaned_str = re.sub(r'\s+', ' ', cleaned_str).strip()
-    return cleaned_str
+clean_text = make_cleaner()
 
 def parse_activity_details(type_raw, type_cleaned, dossier_id):
     """
@@ -0,0 +1,164 @@
+# process_variants.py
+import heapq
+import sqlite3
+import argparse
+from itertools import groupby
+from collections import Counter, defaultdict
+
+END = "(end)"  # Pseudo-step used when reporting dossiers whose path stops at a node.
+
+
+class VariantNode:
+    """One step of a legislative path. Postings list every dossier whose path passes through it."""
+    __slots__ = ("action", "children", "dossier_ids", "ending_dossier_ids")
+
+    def __init__(self, action=None):
+        self.action = action
+        self.children = {}
+        self.dossier_ids = []
+        self.ending_dossier_ids = []
+
+    @property
+    def count(self):
+        return len(self.dossier_ids)
+
+    @property
+    def ending_count(self):
+        return len(self.ending_dossier_ids)
+
+
+class VariantTrie:
+    """
+    Prefix tree of every dossier's ordered action sequence. Built once; prefix lookups walk at most
+    len(prefix) nodes, and the postings at each node answer "which dossiers" without touching Activities.
+    """
+
+    def __init__(self, collapse_repeats=True):
+        self.root = VariantNode()
+        self.collapse_repeats = collapse_repeats
+        # Every node per action, so questions about an action anywhere in the path skip the walk.
+        self.nodes_by_action = defaultdict(list)
+
+    def add(self, dossier_id, actions):
+        """Inserts one dossier's action sequence."""
+        if self.collapse_repeats:
+            # 'Avis, Avis, Avis' is one stage of the path, not three.
+            actions = [action for action, _ in groupby(actions)]
+
+        node = self.root
+        node.dossier_ids.append(dossier_id)
+        for action in actions:
+            child = node.children.get(action)
+            if child is None:
+                child = node.children[action] = VariantNode(action)
+                self.nodes_by_action[action].append(child)
+            node = child
+            node.dossier_ids.append(dossier_id)
+        node.ending_dossier_ids.append(dossier_id)
+
+    @classmethod
+    def from_rows(cls, rows, collapse_repeats=True):
+        """Builds the trie from (dossier_id, action) rows already ordered by dossier and time."""
+        trie = cls(collapse_repeats)
+        for dossier_id, dossier_rows in groupby(rows, key=lambda row: row[0]):
+            trie.add(dossier_id, [action for _, action in dossier_rows if action])
+        return trie
+
+    @classmethod
+    def from_connection(cls, conn, collapse_repeats=True):
+        """Builds the trie with a single ordered scan of Activities."""
+        rows = conn.execute("""
+            SELECT dossier_id, action FROM Activities
+            WHERE action IS NOT NULL
+            ORDER BY dossier_id, activity_date, activity_id
+        """)
+        return cls.from_rows(rows, collapse_repeats)
+
+    @property
+    def dossier_count(self):
+        return self.root.count
+
+    def find(self, prefix):
+        """Returns the node reached by following prefix, or None if no dossier took that path."""
+        node = self.root
+        for action in prefix:
+            node = node.children.get(action)
+            if node is None:
+                return None
+        return node
+
+    def dossiers_with_prefix(self, prefix):
+        node = self.find(prefix)
+        return list(node.dossier_ids) if node else []
+
+    def dossiers_with_variant(self, variant):
+        """Dossiers whose whole path is exactly variant."""
+        node = self.find(variant)
+        return list(node.ending_dossier_ids) if node else []
+
+    def next_steps(self, prefix):
+        """
+        How dossiers continue after prefix: [(action, dossiers, fraction), ...], most common first.
+        Dossiers whose path stops at prefix are reported as END.
+        """
+        node = self.find(prefix)
+        return self._step_fractions([node] if node is not None else [])
+
+    def next_steps_anywhere(self, action):
+        """
+        How paths continue after action wherever it occurs, not only at a given prefix.
+        A dossier passing through action twice (e.g. Avis before and after the report) counts twice.
+        """
+        return self._step_fractions(self.nodes_by_action.get(action, []))
+
+    @staticmethod
+    def _step_fractions(nodes):
+        steps = Counter()
+        for node in nodes:
+            for child in node.children.values():
+                steps[child.action] += child.count
+            if node.ending_count:
+                steps[END] += node.ending_count
+        total = sum(steps.values())
+        return [(action, count, count / total) for action, count in steps.most_common()]
+
+    def iter_variants(self):
+        """Yields (variant, dossier count) for every complete path."""
+        stack = [(self.root, ())]
+        while stack:
+            node, path = stack.pop()
+            if node.ending_count:
+                yield path, node.ending_count
+            for child in node.children.values():
+                stack.append((child, path + (child.action,)))
+
+    def top_variants(self, k=10):
+        """The k most frequent complete paths as [(variant, dossier count), ...]."""
+        return heapq.nlargest(k, self.iter_variants(), key=lambda variant: variant[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the legislative process variants of the dossiers.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("--prefix", type=str, default=None, help="Comma-separated action path, e.g. 'Avis,Rapport de commission'.")
+    parser.add_argument("--after", type=str, default=None, help="Report how paths continue after this action, wherever it occurs.")
+    parser.add_argument("--top", type=int, default=10, help="Number of variants to print.")
+
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_name)
+    trie = VariantTrie.from_connection(conn)
+    conn.close()
+
+    if args.after:
+        for action, count, fraction in trie.next_steps_anywhere(args.after):
+            print(f"  {args.after} then {action}: {count} ({fraction:.1%})")
+    elif args.prefix:
+        prefix = [action.strip() for action in args.prefix.split(",")]
+        node = trie.find(prefix)
+        print(f"{node.count if node else 0} of {trie.dossier_count} dossiers start with {' → '.join(prefix)}")
+        for action, count, fraction in trie.next_steps(prefix):
+            print(f"  then {action}: {count} ({fraction:.1%})")
+    else:
+        for variant, count in trie.top_variants(args.top):
+            print(f"{count:>6}  {' → '.join(variant) or END}")
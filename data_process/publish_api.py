@@ -0,0 +1,233 @@
+# publish_api.py
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import sqlite3
+import argparse
+import unicodedata
+import urllib.parse
+from datetime import datetime
+from collections import defaultdict
+
+from text_store import register_text_functions
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only identity and gzip variants are published.
+    brotli = None
+
+DEFAULT_OUTPUT_DIR = "api_artifacts"
+DEFAULT_BASE_URL = "http://localhost:8080"
+# Published versions kept next to the live one, for rollback and for readers still holding an old path.
+DEFAULT_KEEP_VERSIONS = 2
+# output_dir is switched with a symlink, which Windows only allows with extra privileges: publishing is POSIX-only.
+PUBLISH_SUPPORTED = os.name != "nt"
+UNCATEGORIZED = "Autre"
+
+
+def category_slug(name):
+    """'Dispense du second vote' -> 'dispense-du-second-vote', 'Dépôt' -> 'depot'."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return "-".join("".join(c if c.isalnum() else " " for c in ascii_name.lower()).split())
+
+
+def normalize_link(link):
+    """Percent-encodes the path once, so clients can use the link as-is."""
+    if not link:
+        return ""
+    parts = urllib.parse.urlsplit(link)
+    return urllib.parse.urlunsplit(parts._replace(path=urllib.parse.quote(parts.path, safe="/%")))
+
+
+def encode_json(payload):
+    """Compact UTF-8 JSON, as served."""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_records(conn):
+    """Reads activities joined with their dossier in the ActivityFull shape of api/main.go."""
+    register_text_functions(conn)
+    rows = conn.execute("""
+        SELECT
+            a.dossier_id, a.activity_date, a.activity_text, a.actor, a.activity_link, a.action,
+            d.title, d.final_status
+        FROM ActivitiesWithText a
+        JOIN Dossiers d ON d.dossier_id = a.dossier_id
+        ORDER BY a.dossier_id, a.activity_date, a.activity_id
+    """)
+
+    records = []
+    for dossier_id, date, text, actor, link, action, title, status in rows:
+        category_pretty = action or UNCATEGORIZED
+        records.append({
+            "date": date,
+            "type": text or "",
+            "description": actor or "",
+            "link": normalize_link(link),  # Dropped below when empty, like the API's omitempty
+            "category": category_slug(category_pretty),
+            "category_pretty": category_pretty,
+            "dossier_id": dossier_id,
+            "dossier_name": title or "",
+            "dossier_status": status or "",
+            "dossier_authors": "",
+            "dossier_content": "",
+        })
+        if not records[-1]["link"]:
+            del records[-1]["link"]
+    return records
+
+
+ACTIVITY_FIELDS = ["date", "type", "description", "link", "category", "category_pretty"]
+DOSSIER_FIELDS = ["dossier_id", "dossier_name", "dossier_status", "dossier_authors", "dossier_content"]
+
+
+def build_documents(records, base_url):
+    """Returns {relative path: payload} for every endpoint of the API; paths mirror the routes in api/main.go."""
+    by_dossier, by_category = defaultdict(list), defaultdict(list)
+    for record in records:
+        by_dossier[record["dossier_id"]].append(record)
+        by_category[record["category"]].append(record)
+
+    documents = {"activities.json": records}
+
+    for dossier_id, dossier_records in by_dossier.items():
+        dossier = {field: dossier_records[0][field] for field in DOSSIER_FIELDS}
+        dossier["activities"] = [{field: r[field] for field in ACTIVITY_FIELDS if field in r} for r in dossier_records]
+        documents[f"activities/dossier/{dossier_id}.json"] = dossier
+
+    for category, category_records in by_category.items():
+        documents[f"activities/category/{category}.json"] = category_records
+
+    documents["categories.json"] = [
+        {
+            "category": category_records[0]["category_pretty"],
+            "link": f"{base_url}/activities/category/{category}",
+            "number of activities": len(category_records),
+        }
+        for category, category_records in by_category.items()
+    ]
+    documents["dossiers.json"] = [
+        {
+            "dossier id": dossier_id,
+            "dossier name": dossier_records[0]["dossier_name"],
+            "dossier status": dossier_records[0]["dossier_status"],
+            "link": f"{base_url}/activities/dossier/{dossier_id}",
+            "number of activities": len(dossier_records),
+        }
+        for dossier_id, dossier_records in by_dossier.items()
+    ]
+    return documents
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_artifact(output_dir, relative_path, data):
+    """Writes the identity bytes plus precompressed variants. Returns the manifest entry."""
+    digest = hashlib.sha256(data).hexdigest()
+    etag = digest[:32]
+    entry = {
+        "content_type": "application/json; charset=utf-8",
+        "size": len(data),
+        "sha256": digest,
+        "etag": f'"{etag}"',
+        "encodings": {},
+    }
+    _write(os.path.join(output_dir, relative_path), data)
+
+    # mtime=0 keeps the gzip bytes (and therefore their ETag) stable across identical publishes.
+    variants = {"gzip": (".gz", gzip.compress(data, compresslevel=9, mtime=0))}
+    if brotli is not None:
+        variants["br"] = (".br", brotli.compress(data, quality=11))
+
+    for encoding, (suffix, compressed) in variants.items():
+        # Skip variants that would not be smaller than the identity body.
+        if len(compressed) >= len(data):
+            continue
+        _write(os.path.join(output_dir, relative_path + suffix), compressed)
+        entry["encodings"][encoding] = {
+            "path": relative_path + suffix,
+            "size": len(compressed),
+            "etag": f'"{etag}-{encoding}"',
+        }
+    return entry
+
+
+def versions_dir(output_dir):
+    """Directory holding every published version; output_dir itself is a symlink into it."""
+    return f"{os.path.abspath(output_dir)}.versions"
+
+
+def switch_symlink(output_dir, version_path):
+    """
+    Points output_dir at version_path by renaming a fresh symlink over it. The rename is atomic,
+    so a reader resolves output_dir to either the old or the new complete version, never to nothing.
+    """
+    output_path = os.path.abspath(output_dir)
+    if os.path.isdir(output_path) and not os.path.islink(output_path):
+        # One-time migration from the old plain-directory layout.
+        os.rename(output_path, os.path.join(versions_dir(output_dir), "unversioned"))
+
+    link_path = f"{output_path}.link-{os.getpid()}"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(os.path.relpath(version_path, os.path.dirname(output_path)), link_path)
+    os.replace(link_path, output_path)
+
+
+def prune_versions(output_dir, keep):
+    """Removes all but the newest `keep` versions besides the one output_dir points at."""
+    live = os.path.realpath(output_dir)
+    root = versions_dir(output_dir)
+    versions = sorted(os.path.join(root, name) for name in os.listdir(root))
+    stale = [path for path in versions if os.path.realpath(path) != live]
+    for path in stale[:max(0, len(stale) - keep)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def publish(db_name, output_dir=DEFAULT_OUTPUT_DIR, base_url=DEFAULT_BASE_URL, keep=DEFAULT_KEEP_VERSIONS):
+    """
+    Builds all API artifacts into a new version directory and then atomically switches the
+    output_dir symlink to it, so a server never sees a missing or half-written set. POSIX only.
+    """
+    if not PUBLISH_SUPPORTED:
+        raise OSError("Publishing switches output_dir with a symlink and is not supported on Windows.")
+    conn = sqlite3.connect(db_name)
+    records = load_records(conn)
+    conn.close()
+
+    documents = build_documents(records, base_url.rstrip("/"))
+    version_path = os.path.join(versions_dir(output_dir), f"{datetime.now():%Y%m%d%H%M%S%f}")
+
+    manifest = {}
+    for relative_path, payload in documents.items():
+        manifest[relative_path] = write_artifact(version_path, relative_path, encode_json(payload))
+    # The manifest is written last; its presence marks a complete artifact set.
+    _write(os.path.join(version_path, "manifest.json"), json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+    switch_symlink(output_dir, version_path)
+    prune_versions(output_dir, keep)
+
+    logging.info(f"Published {len(documents)} API documents ({len(records)} activities) to '{output_dir}' -> {os.path.basename(version_path)}.")
+    if brotli is None:
+        logging.info("brotli is not installed; only gzip variants were written.")
+    return manifest
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Publish ready-to-serve JSON artifacts for the CHD activities API.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("--out", type=str, default=DEFAULT_OUTPUT_DIR, help="Output directory for the artifacts.")
+    parser.add_argument("--base_url", type=str, default=DEFAULT_BASE_URL, help="Public base URL used in index links.")
+    parser.add_argument("--keep_versions", type=int, default=DEFAULT_KEEP_VERSIONS, help="Previous artifact versions kept besides the live one.")
+
+    args = parser.parse_args()
+    publish(args.db_name, args.out, args.base_url, args.keep_versions)
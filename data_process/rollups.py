@@ -0,0 +1,203 @@
+# rollups.py
+import sqlite3
+import logging
+import argparse
+from datetime import date, timedelta
+
+# Dimensions rolled up from Activities. 'all' counts every activity regardless of its attributes.
+DIMENSIONS = {
+    "all": "''",
+    "action": "action",
+    "rapporteur": "rapporteur",
+    "publication_source": "publication_source",
+}
+
+# Period keys per grain, derived from the ISO activity_date (YYYY-MM-DD).
+GRAINS = {
+    "day": "activity_date",
+    "month": "substr(activity_date, 1, 7)",
+    "year": "substr(activity_date, 1, 4)",
+}
+GRAIN_KEY_LENGTHS = {"day": 10, "month": 7, "year": 4}
+# Only well-formed ISO dates are rolled up; the parser lets through values such as '14-10-07'.
+ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+def create_rollup_tables(conn, reset=False):
+    """Creates the rollup tables. reset=True discards them, e.g. when Activities is rebuilt from scratch."""
+    cursor = conn.cursor()
+    if reset:
+        cursor.execute("DROP TABLE IF EXISTS ActivityRollups")
+        cursor.execute("DROP TABLE IF EXISTS RollupState")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ActivityRollups (
+        grain TEXT NOT NULL,
+        period TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        activity_count INTEGER NOT NULL,
+        PRIMARY KEY (dimension, grain, period, value)
+    ) WITHOUT ROWID""")
+
+    # High-water mark of the activities already folded into the rollups.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS RollupState (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_activity_id INTEGER NOT NULL
+    )""")
+    cursor.execute("INSERT OR IGNORE INTO RollupState (id, last_activity_id) VALUES (1, 0)")
+    conn.commit()
+
+
+def update_rollups(conn):
+    """Folds activities inserted since the last update into every grain and dimension."""
+    create_rollup_tables(conn)
+    cursor = conn.cursor()
+
+    last_id = cursor.execute("SELECT last_activity_id FROM RollupState WHERE id = 1").fetchone()[0]
+    max_id = cursor.execute("SELECT COALESCE(MAX(activity_id), 0) FROM Activities").fetchone()[0]
+    if max_id < last_id:
+        # Activities was rebuilt behind our back; start over instead of double counting.
+        logging.warning("Activities is behind the rollup watermark. Rebuilding rollups.")
+        create_rollup_tables(conn, reset=True)
+        last_id = 0
+    if max_id == last_id:
+        logging.info("Rollups are up to date.")
+        return
+
+    # One UNION ALL branch per (grain, dimension); each row of the delta is read once per branch.
+    branches = [
+        f"SELECT '{grain}' as grain, {period} as period, '{dimension}' as dimension, {column} as value "
+        f"FROM NewActivities WHERE {column} IS NOT NULL"
+        for grain, period in GRAINS.items()
+        for dimension, column in DIMENSIONS.items()
+    ]
+    cursor.execute(f"""
+        WITH NewActivities AS MATERIALIZED (
+            SELECT activity_date, action, rapporteur, publication_source
+            FROM Activities
+            WHERE activity_id > ? AND activity_id <= ? AND activity_date GLOB ?
+        )
+        INSERT INTO ActivityRollups (grain, period, dimension, value, activity_count)
+        SELECT grain, period, dimension, value, COUNT(*)
+        FROM ({" UNION ALL ".join(branches)})
+        GROUP BY grain, period, dimension, value
+        ON CONFLICT (dimension, grain, period, value)
+        DO UPDATE SET activity_count = activity_count + excluded.activity_count
+    """, (last_id, max_id, ISO_DATE_GLOB))
+    cursor.execute("UPDATE RollupState SET last_activity_id = ? WHERE id = 1", (max_id,))
+    conn.commit()
+    logging.info(f"Rolled up activities {last_id + 1}..{max_id}.")
+
+
+def _next_month(day):
+    return date(day.year + (day.month == 12), day.month % 12 + 1, 1)
+
+
+def covering_periods(start, end):
+    """
+    Splits the inclusive date range [start, end] into the fewest rollup buckets:
+    whole years where possible, whole months next, single days only at the ragged edges.
+    Returns {grain: [period, ...]}; its size depends on the range length in years, not on data volume.
+    """
+    periods = {"day": [], "month": [], "year": []}
+    current, stop = date.fromisoformat(start), date.fromisoformat(end) + timedelta(days=1)
+
+    while current < stop:
+        if current.month == 1 and current.day == 1 and date(current.year + 1, 1, 1) <= stop:
+            periods["year"].append(f"{current.year:04d}")
+            current = date(current.year + 1, 1, 1)
+        elif current.day == 1 and _next_month(current) <= stop:
+            periods["month"].append(current.strftime("%Y-%m"))
+            current = _next_month(current)
+        else:
+            periods["day"].append(current.isoformat())
+            current += timedelta(days=1)
+    return periods
+
+
+def count_activities(conn, dimension, start=None, end=None, value=None):
+    """
+    Returns {value: activity count} for one dimension over the inclusive date range [start, end],
+    answered from the coarsest rollup grains that exactly cover the range. start or end may be None.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'. Expected one of {list(DIMENSIONS)}.")
+
+    # An open end is covered by whole years beyond the bounded part, so the number of keys never
+    # depends on outlying dates (e.g. a mistyped year 3005).
+    conditions, params = [], [dimension]
+    if start is None and end is None:
+        conditions.append("grain = 'year'")
+        bounded = None
+    elif start is None:
+        end_year = date.fromisoformat(end).year
+        conditions.append("(grain = 'year' AND period < ?)")
+        params.append(f"{end_year:04d}")
+        bounded = (f"{end_year:04d}-01-01", end)
+    elif end is None:
+        start_year = date.fromisoformat(start).year
+        conditions.append("(grain = 'year' AND period > ?)")
+        params.append(f"{start_year:04d}")
+        bounded = (start, f"{start_year:04d}-12-31")
+    else:
+        bounded = (start, end)
+
+    if bounded:
+        for grain, keys in covering_periods(*bounded).items():
+            if keys:
+                conditions.append(f"(grain = ? AND period IN ({', '.join('?' * len(keys))}))")
+                params.extend([grain, *keys])
+    if not conditions:
+        return {}
+
+    query = f"""
+        SELECT value, SUM(activity_count) FROM ActivityRollups
+        WHERE dimension = ? AND ({" OR ".join(conditions)})
+    """
+    if value is not None:
+        query += " AND value = ?"
+        params.append(value)
+    query += " GROUP BY value ORDER BY SUM(activity_count) DESC"
+    return dict(conn.execute(query, params).fetchall())
+
+
+def activity_series(conn, dimension, grain, start=None, end=None, value=None):
+    """Returns [(period, value, count), ...] at the given grain, e.g. activities per month per action."""
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain '{grain}'. Expected one of {list(GRAINS)}.")
+
+    query = "SELECT period, value, activity_count FROM ActivityRollups WHERE dimension = ? AND grain = ?"
+    params = [dimension, grain]
+    # Period keys are prefixes of ISO dates, so bounds are truncated to the grain's key length.
+    if start is not None:
+        query += " AND period >= ?"
+        params.append(start[:GRAIN_KEY_LENGTHS[grain]])
+    if end is not None:
+        query += " AND period <= ?"
+        params.append(end[:GRAIN_KEY_LENGTHS[grain]])
+    if value is not None:
+        query += " AND value = ?"
+        params.append(value)
+    query += " ORDER BY period, value"
+    return conn.execute(query, params).fetchall()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Update and query the activity rollups.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("--dimension", type=str, default="action", choices=list(DIMENSIONS))
+    parser.add_argument("--start", type=str, default=None, help="First day (YYYY-MM-DD), inclusive.")
+    parser.add_argument("--end", type=str, default=None, help="Last day (YYYY-MM-DD), inclusive.")
+    parser.add_argument("--top", type=int, default=15, help="Number of values to print.")
+
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_name)
+    update_rollups(conn)
+    for value, count in list(count_activities(conn, args.dimension, args.start, args.end).items())[:args.top]:
+        print(f"{count:>8}  {value}")
+    conn.close()
@@ -0,0 +1,191 @@
+# snapshot.py
+import os
+import glob
+import shutil
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+# Tables that must be non-empty before a freshly built database may replace the live one.
+REQUIRED_TABLES = ["Dossiers", "Activities"]
+# Largest tolerated shrink of a REQUIRED_TABLES row count relative to the live database (0.1 = 10%).
+# A bigger drop usually means a truncated scrape/ folder rather than dossiers that disappeared.
+MAX_ROW_DROP = 0.1
+# Tables whose rows outlive a rebuild (document download state, change-data-capture state and
+# feed). They are copied from the live database into each new build before it starts.
+PERSISTENT_TABLES = ["Links", "CdcRuns", "ChangeLog", "CdcDossierState", "CdcSeenActivities"]
+
+
+def snapshot_dir(db_name):
+    """Directory holding the previous versions of db_name."""
+    return f"{os.path.abspath(db_name)}.snapshots"
+
+
+def temporary_build_path(db_name):
+    """Build target next to db_name, so the final rename stays on the same filesystem."""
+    return f"{os.path.abspath(db_name)}.building-{os.getpid()}"
+
+
+def seed_persistent_tables(build_path, source_db):
+    """Copies PERSISTENT_TABLES (schema, indexes and rows) from source_db into a new build file."""
+    if not os.path.exists(source_db):
+        return
+
+    conn = sqlite3.connect(build_path)
+    conn.execute("ATTACH DATABASE ? AS live", (source_db,))
+    for table in PERSISTENT_TABLES:
+        schema = conn.execute(
+            "SELECT type, sql FROM live.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL ORDER BY type = 'index'",
+            (table,),
+        ).fetchall()
+        if not schema:
+            continue
+        for _, sql in schema:
+            conn.execute(sql)
+        conn.execute(f"INSERT INTO main.{table} SELECT * FROM live.{table}")
+        logging.info(f"Carried over table {table} from '{source_db}'.")
+    conn.commit()
+    conn.execute("DETACH DATABASE live")
+    conn.close()
+
+
+def optimize_database(db_path):
+    """Refreshes planner statistics and compacts the file. Leaves it in rollback-journal mode."""
+    logging.info(f"Optimizing snapshot: {db_path}")
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def table_counts(db_path):
+    """Row counts of REQUIRED_TABLES in db_path, or {} if it does not exist or lacks the tables."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in REQUIRED_TABLES}
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+
+def validate_database(db_path, baseline=None, max_drop=MAX_ROW_DROP):
+    """
+    Checks integrity and row counts of a built database. Raises ValueError if it is not servable,
+    including when a table shrank by more than max_drop compared to the baseline counts.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        integrity = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if integrity != "ok":
+            raise ValueError(f"Integrity check failed: {integrity}")
+
+        counts = {}
+        for table in REQUIRED_TABLES:
+            counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if counts[table] == 0:
+                raise ValueError(f"Table {table} is empty.")
+            previous = (baseline or {}).get(table)
+            if previous and counts[table] < previous * (1 - max_drop):
+                raise ValueError(
+                    f"Table {table} dropped from {previous} to {counts[table]} rows "
+                    f"(more than {max_drop:.0%}). Check the input, or raise the allowed drop."
+                )
+
+        orphans = conn.execute("""
+            SELECT COUNT(*) FROM Activities
+            WHERE dossier_id NOT IN (SELECT dossier_id FROM Dossiers)
+        """).fetchone()[0]
+        if orphans:
+            raise ValueError(f"{orphans} activities reference unknown dossiers.")
+    finally:
+        conn.close()
+
+    logging.info(f"Snapshot validated: {counts}")
+    return counts
+
+
+def list_snapshots(db_name):
+    """Previous snapshots of db_name, oldest first."""
+    return sorted(glob.glob(os.path.join(snapshot_dir(db_name), "*.db")))
+
+
+def publish_snapshot(build_path, db_name, keep=3):
+    """
+    Atomically replaces db_name with build_path. The current database is kept in the snapshot
+    directory first (as a hard link where possible), and only the newest `keep` snapshots are retained.
+    """
+    if os.path.exists(db_name) and keep > 0:
+        os.makedirs(snapshot_dir(db_name), exist_ok=True)
+        stem = os.path.splitext(os.path.basename(db_name))[0]
+        archived = os.path.join(snapshot_dir(db_name), f"{stem}-{datetime.now():%Y%m%d%H%M%S%f}.db")
+        try:
+            os.link(db_name, archived)
+        except OSError:
+            shutil.copy2(db_name, archived)
+
+    # os.replace is atomic on POSIX and Windows: readers see either the old or the new file.
+    os.replace(build_path, db_name)
+    logging.info(f"Published new snapshot as '{db_name}'.")
+
+    snapshots = list_snapshots(db_name)
+    for old in snapshots[:max(0, len(snapshots) - keep)]:
+        os.remove(old)
+
+
+def run_snapshot_build(db_name, build, keep=3, max_drop=MAX_ROW_DROP):
+    """
+    Calls build(path) against a temporary database, then optimizes, validates and publishes it.
+    Row counts are compared with the live database. The live database is left untouched if any step fails.
+    """
+    build_path = temporary_build_path(db_name)
+    if os.path.exists(build_path):
+        os.remove(build_path)
+
+    try:
+        baseline = table_counts(db_name)
+        seed_persistent_tables(build_path, db_name)
+        build(build_path)
+        optimize_database(build_path)
+        validate_database(build_path, baseline, max_drop)
+        publish_snapshot(build_path, db_name, keep)
+    except Exception:
+        logging.error(f"Snapshot build failed; '{db_name}' was not modified.", exc_info=True)
+        for path in (build_path, f"{build_path}-journal"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+
+def rollback_snapshot(db_name):
+    """Restores the most recent snapshot of db_name atomically and removes it from the snapshot list."""
+    snapshots = list_snapshots(db_name)
+    if not snapshots:
+        raise FileNotFoundError(f"No snapshots found for '{db_name}'.")
+
+    latest = snapshots[-1]
+    restore_path = temporary_build_path(db_name)
+    shutil.copy2(latest, restore_path)
+    os.replace(restore_path, db_name)
+    os.remove(latest)
+    logging.info(f"Rolled '{db_name}' back to {os.path.basename(latest)}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspect or roll back database snapshots.")
+    parser.add_argument("db_name", type=str, help="Live SQLite database file.")
+    parser.add_argument("--rollback", action="store_true", help="Restore the most recent snapshot.")
+
+    args = parser.parse_args()
+
+    if args.rollback:
+        rollback_snapshot(args.db_name)
+    else:
+        for path in list_snapshots(args.db_name):
+            print(path)
@@ -0,0 +1,78 @@
+# test_build_sharded.py
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import process_dossiers_v4
+from build_sharded import build_shard
+from process_dossiers_v4 import setup_database, ingest_files
+
+FAILING_TEXT = "Avis du Conseil d'Etat (échec simulé)"
+intern_text = process_dossiers_v4.intern_text
+
+
+def failing_intern_text(cursor, text):
+    """intern_text that fails on FAILING_TEXT, after earlier activities of the same file were inserted."""
+    if text == FAILING_TEXT:
+        raise sqlite3.OperationalError("simulated failure")
+    return intern_text(cursor, text)
+
+
+class FailedFileRollbackTest(unittest.TestCase):
+    """A file that fails partway must leave nothing behind, in a shard as in a serial build."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.json_files = []
+        for dossier_id in ("7001", "7002", "7003"):
+            activities = [
+                {"date": "05.03.2014", "type": "Déposé"},
+                {"date": "12.06.2014", "type": "Avis du Conseil d'Etat"},
+            ]
+            if dossier_id == "7002":
+                activities.append({"date": "20.09.2014", "type": FAILING_TEXT})
+            file_path = os.path.join(self.tmp.name, f"{dossier_id}.json")
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump({"dossier_id": dossier_id, "activities": activities}, f)
+            self.json_files.append(file_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ingest(self, build):
+        with mock.patch.object(process_dossiers_v4, "intern_text", failing_intern_text):
+            db_path = build()
+
+        conn = sqlite3.connect(db_path)
+        counts = {
+            table: dict(conn.execute(f"SELECT dossier_id, COUNT(*) FROM {table} GROUP BY dossier_id").fetchall())
+            for table in ("Dossiers", "Activities", "IngestProgress")
+        }
+        conn.close()
+        return counts
+
+    def serial_build(self):
+        db_path = os.path.join(self.tmp.name, "serial.db")
+        conn = setup_database(db_path)
+        ingest_files(conn, self.json_files)
+        conn.close()
+        return db_path
+
+    def shard_build(self):
+        return build_shard((os.path.join(self.tmp.name, "shard.db"), self.json_files))
+
+    def test_serial_build_rolls_back_failed_file(self):
+        counts = self.ingest(self.serial_build)
+        for table in ("Dossiers", "Activities", "IngestProgress"):
+            self.assertNotIn("7002", counts[table])
+        self.assertEqual(counts["Activities"], {"7001": 2, "7003": 2})
+
+    def test_shard_matches_serial_build(self):
+        self.assertEqual(self.ingest(self.shard_build), self.ingest(self.serial_build))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+# test_document_store.py
+import os
+import glob
+import sqlite3
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from document_store import create_links_table, document_path, download_documents
+
+REPORT = b"%PDF-1.4 rapport de commission"
+AVIS = b"%PDF-1.4 avis du Conseil d'Etat"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves self.server.routes: {path: body}. Bodies are tagged with an ETag and honour If-None-Match."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/truncated.pdf":
+            # Promise more bytes than are sent, then drop the connection mid-stream.
+            self.send_response(200)
+            self.send_header("Content-Length", "100000")
+            self.end_headers()
+            self.wfile.write(b"%PDF-1.4 partial")
+            self.close_connection = True
+            return
+
+        body = self.server.routes.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{len(body)}-{hash(body) & 0xffff}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DocumentStoreTest(unittest.TestCase):
+    """Offline tests of download_documents against a local stub HTTP server."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.routes = {"/7001/Rapport.pdf": REPORT, "/7001/Rapport-copie.pdf": REPORT, "/7002/Avis.pdf": AVIS}
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp.name, "links.db")
+        self.store = os.path.join(self.tmp.name, "store")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def add_links(self, *paths):
+        conn = sqlite3.connect(self.db_name)
+        create_links_table(conn)
+        conn.executemany("INSERT INTO Links (url) VALUES (?)", [(self.base_url + path,) for path in paths])
+        conn.commit()
+        conn.close()
+
+    def links(self):
+        conn = sqlite3.connect(self.db_name)
+        rows = conn.execute("SELECT url, sha256, http_status FROM Links ORDER BY link_id").fetchall()
+        conn.close()
+        return {url[len(self.base_url):]: (sha256, status) for url, sha256, status in rows}
+
+    def stored_objects(self):
+        return glob.glob(os.path.join(self.store, "objects", "*", "*"))
+
+    def test_download_stores_content_addressed(self):
+        self.add_links("/7002/Avis.pdf")
+        counts = download_documents(self.db_name, self.store)
+
+        self.assertEqual(counts["downloaded"], 1)
+        sha256, status = self.links()["/7002/Avis.pdf"]
+        self.assertEqual(status, 200)
+        with open(document_path(self.store, sha256), "rb") as f:
+            self.assertEqual(f.read(), AVIS)
+
+    def test_identical_content_is_stored_once(self):
+        self.add_links("/7001/Rapport.pdf", "/7001/Rapport-copie.pdf")
+        download_documents(self.db_name, self.store)
+
+        links = self.links()
+        self.assertEqual(links["/7001/Rapport.pdf"][0], links["/7001/Rapport-copie.pdf"][0])
+        self.assertEqual(len(self.stored_objects()), 1)
+
+    def test_missing_document_is_recorded_and_not_refetched(self):
+        self.add_links("/7003/Absent.pdf")
+        counts = download_documents(self.db_name, self.store)
+
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(self.links()["/7003/Absent.pdf"], (None, 404))
+
+        download_documents(self.db_name, self.store)
+        self.assertEqual(self.server.requests.count("/7003/Absent.pdf"), 1)
+
+        download_documents(self.db_name, self.store, retry_failed=True)
+        self.assertEqual(self.server.requests.count("/7003/Absent.pdf"), 2)
+
+    def test_revalidation_uses_conditional_requests(self):
+        self.add_links("/7002/Avis.pdf")
+        download_documents(self.db_name, self.store)
+        counts = download_documents(self.db_name, self.store, revalidate=True)
+
+        self.assertEqual(counts, {"downloaded": 0, "not_modified": 1, "failed": 0})
+        sha256, status = self.links()["/7002/Avis.pdf"]
+        self.assertEqual(status, 304)
+        self.assertTrue(os.path.exists(document_path(self.store, sha256)))
+
+    def test_interrupted_download_leaves_no_temporary_file(self):
+        self.add_links("/truncated.pdf")
+        counts = download_documents(self.db_name, self.store)
+
+        self.assertEqual(counts["failed"], 1)
+        self.assertEqual(glob.glob(os.path.join(self.store, ".download-*")), [])
+        self.assertEqual(self.links()["/truncated.pdf"], (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# text_cleaning.py
+import re
+import os
+import json
+import time
+import argparse
+
+# Scraper artifacts from the chd.lu activity lists. Matched case-insensitively.
+BOILERPLATE_PHRASES = [
+    "Bouton graphique servant à afficher ou cacher tous les éléments de la liste qui précède",
+    "Show more",
+    "Voir moins",
+]
+
+# Dossier/sub-id prefixes like '4469/2' on the first line of an activity.
+DOSSIER_PREFIX_PATTERN = re.compile(r"\d{4,}/\d+\s*\n")
+
+
+def phrase_pattern(phrases):
+    """
+    Compiles the phrases into one case-insensitive regex shaped like a trie, so shared prefixes are
+    matched once. A lookahead on the possible first characters lets the scan skip every other position
+    without entering the alternation.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase.lower():
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of a phrase
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # A phrase that is a prefix of a longer one: the longer one is tried first.
+        return f"(?:{body})?" if "" in node else body
+
+    first_chars = {char for phrase in phrases for char in (phrase[0].lower(), phrase[0].upper())}
+    return re.compile(f"(?=[{re.escape(''.join(sorted(first_chars)))}]){emit(trie)}", re.IGNORECASE)
+
+
+def make_cleaner(phrases=BOILERPLATE_PHRASES, strip_dossier_prefix=False):
+    """
+    Returns a clean_text(text) function that removes every phrase in a single regex pass and then
+    collapses whitespace runs to one space. Output is identical to removing each phrase with its own
+    re.sub followed by re.sub(r'\\s+', ' ', ...).strip().
+    """
+    pattern = phrase_pattern(phrases) if phrases else None
+
+    def clean_text(text):
+        """General purpose text cleaner."""
+        if not text:
+            return ""
+        if strip_dossier_prefix:
+            prefix = DOSSIER_PREFIX_PATTERN.match(text)
+            if prefix:
+                text = text[prefix.end():]
+        if pattern is not None:
+            text = pattern.sub("", text)
+        # str.split() uses the same notion of whitespace as \s and runs in C.
+        return " ".join(text.split())
+
+    return clean_text
+
+
+clean_text = make_cleaner()
+
+
+def _multi_pass_clean_text(text_str):
+    """The previous cleaner of process_dossiers.py: one re.sub per phrase. Kept as the benchmark baseline."""
+    if not text_str:
+        return ""
+    cleaned_str = re.sub(r"^\d{4,}/\d+\s*\n", "", text_str)
+    for pattern in BOILERPLATE_PHRASES:
+        cleaned_str = re.sub(pattern, "", cleaned_str, flags=re.IGNORECASE)
+    return re.sub(r'\s+', ' ', cleaned_str).strip()
+
+
+def load_activity_texts(json_path):
+    """Every activity type and description in the scraped corpus."""
+    texts = []
+    for file_name in sorted(os.listdir(json_path)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(json_path, file_name), 'r', encoding='utf-8') as f:
+                for activity in json.load(f).get("activities", []):
+                    texts.append(activity.get("type", ""))
+                    texts.append(activity.get("description", ""))
+    return texts
+
+
+def benchmark(texts, repeat=3):
+    """Times the multi-pass and single-pass cleaners on texts and checks that they agree."""
+    single_pass = make_cleaner(strip_dossier_prefix=True)
+    mismatches = sum(1 for text in texts if single_pass(text) != _multi_pass_clean_text(text))
+
+    results = {}
+    for name, cleaner in [("multi-pass", _multi_pass_clean_text), ("single-pass", single_pass)]:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                cleaner(text)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results, mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass text cleaner against the multi-pass one.")
+    parser.add_argument("json_path", type=str, help="Path to the folder containing the scraped JSON files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per cleaner; the best time is reported.")
+
+    args = parser.parse_args()
+
+    texts = load_activity_texts(args.json_path)
+    total_mb = sum(len(text) for text in texts) / 1e6
+    results, mismatches = benchmark(texts, args.repeat)
+
+    print(f"{len(texts)} texts, {total_mb:.1f} MB")
+    for name, seconds in results.items():
+        print(f"{name:>12}: {seconds:.3f}s ({total_mb / seconds:.1f} MB/s)")
+    print(f"Speed-up: {results['multi-pass'] / results['single-pass']:.2f}x, mismatching outputs: {mismatches}")
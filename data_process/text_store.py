@@ -0,0 +1,198 @@
+# text_store.py
+import zlib
+import hashlib
+import logging
+import sqlite3
+import argparse
+from collections import Counter
+
+# Codecs of ActivityTexts.body
+CODEC_PLAIN = 0    # body is the text itself
+CODEC_ZLIB = 1     # body is raw deflate data compressed with the shared dictionary dict_id
+
+# Bodies shorter than this stay plain: short strings such as "Déposé" do not shrink under deflate.
+MIN_COMPRESS_LENGTH = 96
+# zlib only looks back 32 KB, so a larger preset dictionary would be wasted.
+MAX_DICTIONARY_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 9
+
+
+def create_text_tables(conn, reset=False):
+    """Creates the interned text table and the shared compression dictionaries."""
+    cursor = conn.cursor()
+    if reset:
+        cursor.execute("DROP VIEW IF EXISTS ActivitiesWithText")
+        cursor.execute("DROP TABLE IF EXISTS ActivityTexts")
+        cursor.execute("DROP TABLE IF EXISTS TextDictionaries")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS TextDictionaries (
+        dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        zdict BLOB NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+    # Each distinct activity text is stored once; Activities.text_id points here.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ActivityTexts (
+        text_id INTEGER PRIMARY KEY,
+        text_hash BLOB UNIQUE NOT NULL,
+        codec INTEGER NOT NULL DEFAULT 0,
+        dict_id INTEGER,
+        body BLOB,
+        FOREIGN KEY (dict_id) REFERENCES TextDictionaries (dict_id)
+    )""")
+
+    # Transparent access for connections that called register_text_functions().
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS ActivitiesWithText AS
+    SELECT a.*, inflate_text(t.body, t.codec, t.dict_id) AS activity_text
+    FROM Activities a
+    LEFT JOIN ActivityTexts t ON t.text_id = a.text_id
+    """)
+    conn.commit()
+
+
+def text_hash(text):
+    return hashlib.md5(text.encode('utf-8')).digest()
+
+
+def intern_text(cursor, text):
+    """Returns the text_id for text, storing it (uncompressed) the first time it is seen."""
+    digest = text_hash(text)
+    row = cursor.execute("SELECT text_id FROM ActivityTexts WHERE text_hash = ?", (digest,)).fetchone()
+    if row:
+        return row[0]
+    cursor.execute("INSERT INTO ActivityTexts (text_hash, codec, body) VALUES (?, ?, ?)", (digest, CODEC_PLAIN, text))
+    return cursor.lastrowid
+
+
+def train_dictionary(texts):
+    """
+    Builds a preset deflate dictionary from (text, use_count) pairs. Lines are scored by how much
+    text they would cover (occurrences x length); the best ones are packed up to 32 KB with the
+    most valuable at the end, where deflate finds them at the shortest distance.
+    """
+    line_scores = Counter()
+    for text, use_count in texts:
+        for line in {line.strip() for line in text.splitlines()}:
+            if len(line) >= 8:
+                line_scores[line] += use_count * len(line)
+
+    chosen, size = [], 0
+    for line, score in line_scores.most_common():
+        encoded = line.encode('utf-8') + b"\n"
+        if size + len(encoded) > MAX_DICTIONARY_SIZE:
+            continue
+        # A line seen only once in one text buys nothing over normal compression. Scores are
+        # weighted by length, so such lines are interleaved with repeated ones: skip, don't stop.
+        if score <= len(line):
+            continue
+        chosen.append(encoded)
+        size += len(encoded)
+
+    return b"".join(reversed(chosen))
+
+
+def compress_body(text, zdict):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+def decompress_body(body, zdict):
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=zdict)
+    return (decompressor.decompress(body) + decompressor.flush()).decode('utf-8')
+
+
+def load_dictionaries(conn):
+    return dict(conn.execute("SELECT dict_id, zdict FROM TextDictionaries").fetchall())
+
+
+def compress_texts(conn):
+    """
+    Compresses the long plain bodies in ActivityTexts. A dictionary is trained on the first run
+    and reused afterwards, so incremental runs only touch newly interned texts.
+    """
+    cursor = conn.cursor()
+    pending = cursor.execute("""
+        SELECT t.text_id, t.body, COUNT(a.activity_id)
+        FROM ActivityTexts t
+        LEFT JOIN Activities a ON a.text_id = t.text_id
+        WHERE t.codec = ? AND length(t.body) >= ?
+        GROUP BY t.text_id
+    """, (CODEC_PLAIN, MIN_COMPRESS_LENGTH)).fetchall()
+    if not pending:
+        return
+
+    row = cursor.execute("SELECT dict_id, zdict FROM TextDictionaries ORDER BY dict_id DESC LIMIT 1").fetchone()
+    if row:
+        dict_id, zdict = row
+    else:
+        zdict = train_dictionary((body, use_count) for _, body, use_count in pending)
+        cursor.execute("INSERT INTO TextDictionaries (zdict) VALUES (?)", (zdict,))
+        dict_id = cursor.lastrowid
+        logging.info(f"Trained a {len(zdict)}-byte compression dictionary.")
+
+    updates = []
+    for text_id, body, _ in pending:
+        compressed = compress_body(body, zdict)
+        # Only keep the compressed form when it actually saves space.
+        if len(compressed) < len(body.encode('utf-8')):
+            updates.append((CODEC_ZLIB, dict_id, compressed, text_id))
+
+    cursor.executemany("UPDATE ActivityTexts SET codec = ?, dict_id = ?, body = ? WHERE text_id = ?", updates)
+    conn.commit()
+    logging.info(f"Compressed {len(updates)} of {len(pending)} long activity texts.")
+
+
+def register_text_functions(conn):
+    """Registers inflate_text() on conn so ActivitiesWithText can be queried. Call again after new dictionaries."""
+    dictionaries = load_dictionaries(conn)
+
+    def inflate_text(body, codec, dict_id):
+        if body is None or codec == CODEC_PLAIN:
+            return body
+        return decompress_body(body, dictionaries[dict_id])
+
+    conn.create_function("inflate_text", 3, inflate_text, deterministic=True)
+
+
+def get_activity_texts(conn, activity_ids):
+    """Returns {activity_id: activity_text} for the given activities, decompressing as needed."""
+    dictionaries = load_dictionaries(conn)
+    placeholders = ", ".join("?" * len(activity_ids))
+    rows = conn.execute(f"""
+        SELECT a.activity_id, t.body, t.codec, t.dict_id
+        FROM Activities a JOIN ActivityTexts t ON t.text_id = a.text_id
+        WHERE a.activity_id IN ({placeholders})
+    """, list(activity_ids)).fetchall()
+    return {
+        activity_id: body if codec == CODEC_PLAIN else decompress_body(body, dictionaries[dict_id])
+        for activity_id, body, codec, dict_id in rows
+    }
+
+
+def get_activity_text(conn, activity_id):
+    return get_activity_texts(conn, [activity_id]).get(activity_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Report on the interned and compressed activity text storage.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_name)
+    activities, texts, stored, plain = conn.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM Activities),
+            COUNT(*),
+            SUM(length(CAST(body AS BLOB))),
+            SUM(CASE WHEN codec = 0 THEN 1 ELSE 0 END)
+        FROM ActivityTexts
+    """).fetchone()
+    print(f"Activities: {activities}, distinct texts: {texts} ({plain} stored plain)")
+    print(f"Stored text bytes: {stored}")
+    conn.close()
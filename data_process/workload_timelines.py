@@ -0,0 +1,245 @@
+# workload_timelines.py
+import sqlite3
+import logging
+import argparse
+from datetime import date, timedelta
+from itertools import groupby
+
+from rollups import ISO_DATE_GLOB
+
+# Activities column per entity type. Several commissions on one activity are separated by COMMISSION_SEPARATOR.
+ENTITY_COLUMNS = {
+    "commission": "commission",
+    "rapporteur": "rapporteur",
+}
+COMMISSION_SEPARATOR = "; "
+
+# Dossiers in these states are closed on their last activity; all others are still open.
+CLOSED_STATUSES = ("Publié", "Retiré")
+# An open dossier without activity for this long is counted as closed at last activity + horizon.
+# 99% of the gaps between consecutive activities of published dossiers are shorter than a year.
+OPEN_DOSSIER_HORIZON_DAYS = 730
+
+# The rapporteur extraction runs on into the agenda that follows the name.
+RAPPORTEUR_SUFFIX_SEPARATOR = " - "
+RAPPORTEUR_SEPARATOR = " et "
+PLURAL_HONORIFICS = ("Messieurs ", "Mesdames ")
+HONORIFICS = PLURAL_HONORIFICS + ("Monsieur ", "Madame ", "Mme ", "M. ")
+
+
+def create_workload_tables(conn):
+    """
+    WorkloadIntervals stores, per entity, a step function of its concurrently open dossiers:
+    open_dossiers holds on [valid_from, valid_to). valid_to is NULL while dossiers are still open.
+    Days not covered by any row have no open dossier.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS WorkloadIntervals (
+        entity_type TEXT NOT NULL,
+        entity TEXT NOT NULL,
+        valid_from DATE NOT NULL,
+        valid_to DATE,
+        open_dossiers INTEGER NOT NULL,
+        PRIMARY KEY (entity_type, entity, valid_from)
+    ) WITHOUT ROWID""")
+    conn.commit()
+
+
+def _next_day(day, days=1):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def corpus_end_date(conn):
+    """
+    The latest activity date of the corpus, used as 'now' so that rebuilding the same data gives the same
+    timelines. Dates after today are typos (e.g. '3005-05-03') and are ignored.
+    """
+    row = conn.execute(
+        "SELECT MAX(activity_date) FROM Activities WHERE activity_date GLOB ? AND activity_date <= ?",
+        (ISO_DATE_GLOB, date.today().isoformat()),
+    ).fetchone()
+    return date.fromisoformat(row[0]) if row[0] else date.today()
+
+
+def _strip_honorific(name):
+    for honorific in HONORIFICS:
+        if name.startswith(honorific):
+            return name[len(honorific):].strip()
+    return name
+
+
+def rapporteur_names(values):
+    """
+    Maps raw rapporteur values to lists of names. Agenda text after ' - ' ('Marc Spautz - Présentation du projet
+    de loi') and honorifics are cut. 'Messieurs A et B' and 'A et Monsieur B' give two names; any other ' et '
+    belongs to the agenda. Text after a collapsed line break
+    ('Claude Wiseler Votes sur le projet de loi') is resolved to the shortest name seen elsewhere that the value
+    starts with. Fragments of fewer than two words ('Mme Lydie Err et M') are dropped.
+    """
+    cut = {}
+    for value in values:
+        first, *others = value.split(RAPPORTEUR_SUFFIX_SEPARATOR)[0].split(RAPPORTEUR_SEPARATOR)
+        parts = [first] + [part for part in others if first.startswith(PLURAL_HONORIFICS) or part.startswith(HONORIFICS)]
+        cut[value] = [name for name in (_strip_honorific(part.strip()) for part in parts) if len(name.split()) >= 2]
+
+    known = {name for names in cut.values() for name in names}
+    resolved = {}
+    for value, names in cut.items():
+        resolved[value] = []
+        for name in names:
+            words = name.split()
+            prefixes = (" ".join(words[:n]) for n in range(2, len(words)))
+            resolved[value].append(next((prefix for prefix in prefixes if prefix in known), name))
+    return resolved
+
+
+def entity_intervals(conn, entity_type, horizon_days=OPEN_DOSSIER_HORIZON_DAYS, as_of=None):
+    """
+    Returns [(entity, opened, closed), ...]: one interval per dossier an entity worked on, from the first
+    activity naming the entity to the day after the dossier's last activity. Open dossiers stay open (None)
+    unless they have been inactive for horizon_days by as_of (default: corpus_end_date); they then close at
+    last activity + horizon. Dates that are not ISO days (the parser lets through values such as '14-10-07')
+    are skipped, as in the rollups.
+    """
+    column = ENTITY_COLUMNS[entity_type]
+    rows = conn.execute(f"""
+        SELECT a.dossier_id, a.{column}, MIN(a.activity_date), d.last_activity_date, d.final_status
+        FROM Activities a
+        JOIN Dossiers d ON d.dossier_id = a.dossier_id
+        WHERE a.{column} IS NOT NULL AND a.{column} != ''
+          AND a.activity_date GLOB :iso_date AND d.last_activity_date GLOB :iso_date
+        GROUP BY a.dossier_id, a.{column}
+    """, {"iso_date": ISO_DATE_GLOB}).fetchall()
+
+    if entity_type == "rapporteur":
+        names = rapporteur_names({value for _, value, _, _, _ in rows})
+    as_of = (as_of or corpus_end_date(conn)).isoformat()
+
+    first_seen, closing = {}, {}
+    for dossier_id, value, first_date, last_date, status in rows:
+        try:
+            if status in CLOSED_STATUSES:
+                closing[dossier_id] = _next_day(last_date)
+            else:
+                stale_from = _next_day(last_date, horizon_days)
+                closing[dossier_id] = stale_from if stale_from <= as_of else None
+        except ValueError:
+            continue  # Shaped like a date but no real day, e.g. '2019-02-30'
+
+        entities = value.split(COMMISSION_SEPARATOR) if entity_type == "commission" else names[value]
+        for entity in entities:
+            key = (dossier_id, entity)
+            if key not in first_seen or first_date < first_seen[key]:
+                first_seen[key] = first_date
+
+    return [(entity, opened, closing[dossier_id]) for (dossier_id, entity), opened in first_seen.items()]
+
+
+def sweep(intervals):
+    """
+    Turns [(entity, opened, closed), ...] into step-function rows [(entity, valid_from, valid_to, open_dossiers), ...].
+    Each interval becomes a +1 and a -1 event; one sort plus one linear pass gives O(n log n) overall.
+    """
+    events = []
+    for entity, opened, closed in intervals:
+        if closed is not None and closed <= opened:
+            continue
+        events.append((entity, opened, 1))
+        if closed is not None:
+            events.append((entity, closed, -1))
+    events.sort()
+
+    steps = []
+    for entity, entity_events in groupby(events, key=lambda event: event[0]):
+        open_count, segment_start = 0, None
+        for day, day_events in groupby(entity_events, key=lambda event: event[1]):
+            new_count = open_count + sum(delta for _, _, delta in day_events)
+            if new_count == open_count:
+                continue
+            if open_count:
+                steps.append((entity, segment_start, day, open_count))
+            open_count, segment_start = new_count, day
+        if open_count:
+            steps.append((entity, segment_start, None, open_count))
+    return steps
+
+
+def build_workload_timelines(conn, horizon_days=OPEN_DOSSIER_HORIZON_DAYS):
+    """Recomputes WorkloadIntervals for every entity type from Activities and Dossiers."""
+    as_of = corpus_end_date(conn)
+    logging.info(f"Building commission and rapporteur workload timelines (as of {as_of}).")
+    create_workload_tables(conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM WorkloadIntervals")
+
+    for entity_type in ENTITY_COLUMNS:
+        steps = sweep(entity_intervals(conn, entity_type, horizon_days, as_of))
+        cursor.executemany(
+            "INSERT INTO WorkloadIntervals (entity_type, entity, valid_from, valid_to, open_dossiers) VALUES (?, ?, ?, ?, ?)",
+            [(entity_type, *step) for step in steps],
+        )
+        logging.info(f"Stored {len(steps)} workload intervals for {entity_type} entities.")
+    conn.commit()
+
+
+def open_dossiers_at(conn, entity_type, day, entity=None):
+    """Returns {entity: open dossiers} on the given day (YYYY-MM-DD), busiest first."""
+    query = """
+        SELECT entity, open_dossiers FROM WorkloadIntervals
+        WHERE entity_type = ? AND valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+    """
+    params = [entity_type, day, day]
+    if entity is not None:
+        query += " AND entity = ?"
+        params.append(entity)
+    query += " ORDER BY open_dossiers DESC, entity"
+    return dict(conn.execute(query, params).fetchall())
+
+
+def workload_series(conn, entity_type, entity):
+    """The step function of one entity as [(valid_from, valid_to, open_dossiers), ...]."""
+    return conn.execute("""
+        SELECT valid_from, valid_to, open_dossiers FROM WorkloadIntervals
+        WHERE entity_type = ? AND entity = ?
+        ORDER BY valid_from
+    """, (entity_type, entity)).fetchall()
+
+
+def peak_workloads(conn, entity_type, top=10):
+    """[(entity, peak open dossiers, first day the peak was reached), ...] for the busiest entities."""
+    # SQLite takes the bare valid_from from the row that holds MAX(); ties resolve to the earliest.
+    return conn.execute("""
+        SELECT entity, MAX(open_dossiers), valid_from FROM (
+            SELECT entity, open_dossiers, valid_from FROM WorkloadIntervals
+            WHERE entity_type = ? ORDER BY valid_from
+        )
+        GROUP BY entity
+        ORDER BY MAX(open_dossiers) DESC, entity
+        LIMIT ?
+    """, (entity_type, top)).fetchall()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Build and query commission and rapporteur workload timelines.")
+    parser.add_argument("db_name", type=str, help="SQLite database built by process_dossiers_v4.py.")
+    parser.add_argument("--entity_type", type=str, default="commission", choices=list(ENTITY_COLUMNS))
+    parser.add_argument("--date", type=str, default=None, help="Report open dossiers on this day (YYYY-MM-DD) instead of peaks.")
+    parser.add_argument("--top", type=int, default=15, help="Number of entities to print.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the timelines before querying.")
+    parser.add_argument("--horizon_days", type=int, default=OPEN_DOSSIER_HORIZON_DAYS,
+                        help="With --rebuild: days without activity after which an open dossier no longer counts.")
+
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_name)
+    if args.rebuild:
+        build_workload_timelines(conn, args.horizon_days)
+    if args.date:
+        for entity, count in list(open_dossiers_at(conn, args.entity_type, args.date).items())[:args.top]:
+            print(f"{count:>6}  {entity}")
+    else:
+        for entity, peak, peak_date in peak_workloads(conn, args.entity_type, args.top):
+            print(f"{peak:>6}  {entity} (from {peak_date})")
+    conn.close()